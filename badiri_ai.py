@@ -0,0 +1,308 @@
+"""Gemini client for the Badiri App's AI features.
+
+One pooled HTTP session is shared by every request. Failed calls are retried
+with exponential backoff, and every call has a connect/read timeout. Successful
+responses are cached on disk by a hash of the request, so asking the same
+question twice costs one round trip. Answers expire after CACHE_MAX_AGE and
+only the newest CACHE_MAX_FILES are kept.
+
+Task lists are streamed: :func:`stream_tasks` parses the response as it
+arrives and yields each valid task record as soon as its object closes.
+:class:`TaskStream` runs one request on a small worker pool so the app can
+keep rendering, and :func:`submit_task_batches` runs several concurrently.
+
+Point ``BADIRI_AI_BASE_URL`` at a local stub server to exercise the client
+without a real API key.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BASE_URL = os.environ.get("BADIRI_AI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+MODEL = os.environ.get("BADIRI_AI_MODEL", "gemini-2.5-flash")
+CACHE_DIR = os.environ.get("BADIRI_AI_CACHE", ".ai_cache")
+CACHE_MAX_AGE = 7 * 24 * 3600 # Seconds a cached answer is served before it is asked again
+CACHE_MAX_FILES = 500 # Oldest answers beyond this are deleted after each write
+TIMEOUT = (5, 120) # Seconds to connect, seconds to wait for the model's answer
+RETRIES = 3
+BACKOFF = 0.5 # Retry waits grow as 0.5s, 1s, 2s...
+AI_WORKERS = 4
+
+
+class AIError(Exception):
+    """Raised when the model can't be reached or returns something unusable."""
+
+
+# --- 1. HTTP SESSION ---
+_session = None
+_session_lock = threading.Lock()
+
+
+def session():
+    """Returns the shared session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=RETRIES, backoff_factor=BACKOFF, status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"POST"}), raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=AI_WORKERS, pool_maxsize=AI_WORKERS, max_retries=retry)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+# --- 2. REQUESTS ---
+def text_part(text):
+    return {"text": text}
+
+
+def image_part(data, mime="image/jpeg"):
+    return {"inline_data": {"mime_type": mime, "data": base64.b64encode(data).decode("utf-8")}}
+
+
+def _cache_path(payload):
+    key = hashlib.sha256(json.dumps([MODEL, payload], sort_keys=True).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+
+def _cache_fresh(path):
+    try:
+        return time.time() - os.path.getmtime(path) < CACHE_MAX_AGE
+    except OSError:
+        return False
+
+
+def _read_cache(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["text"]
+
+
+_prune_lock = threading.Lock()
+
+
+def _prune_cache():
+    """Deletes expired answers, then the oldest ones beyond CACHE_MAX_FILES."""
+    with _prune_lock:
+        entries = []
+        for root, _, files in os.walk(CACHE_DIR):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        pass
+        entries.sort(reverse=True)
+        cutoff = time.time() - CACHE_MAX_AGE
+        for i, (mtime, path) in enumerate(entries):
+            if i >= CACHE_MAX_FILES or mtime < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _write_cache(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"text": text}, f)
+    os.replace(tmp, path)
+    _prune_cache()
+
+
+def stream_text(api_key, parts, use_cache=True):
+    """Yields the model's text in pieces as the streamed (SSE) response arrives.
+
+    The full text is cached once the stream completes; a cached answer is
+    yielded as a single piece. The API key is not part of the cache key, so a
+    cached answer is returned without a network call whoever asks.
+    """
+    payload = {"contents": [{"parts": parts}]}
+    path = _cache_path(payload)
+    if use_cache and _cache_fresh(path):
+        yield _read_cache(path)
+        return
+    received = []
+    try:
+        with session().post(
+            f"{BASE_URL}/models/{MODEL}:streamGenerateContent", params={"alt": "sse"}, json=payload,
+            headers={"x-goog-api-key": api_key}, timeout=TIMEOUT, stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            resp.encoding = "utf-8" # SSE is always UTF-8; without a charset requests would assume ISO-8859-1
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                try:
+                    chunk = json.loads(line[5:])
+                    piece = "".join(p.get("text", "") for p in chunk["candidates"][0]["content"]["parts"])
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                    continue
+                received.append(piece)
+                yield piece
+    except requests.RequestException as e:
+        raise AIError(f"AI request failed: {e}") from e
+    _write_cache(path, "".join(received))
+
+
+_pool = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="badiri-ai")
+
+
+# --- 3. RESPONSES ---
+class ObjectScanner:
+    """Incrementally extracts top-level JSON objects from text fed in pieces.
+
+    Braces are counted outside of strings, so objects can be split across
+    pieces in any way. Anything between objects (list brackets, commas,
+    Markdown fences, prose) is ignored. An object that fails to decode comes
+    back as None instead of stopping the scan.
+    """
+
+    def __init__(self):
+        self.buffer, self.depth, self.in_string, self.escaped = [], 0, False, False
+
+    def feed(self, text):
+        """Consumes one piece of text and returns the objects completed by it."""
+        found = []
+        for ch in text:
+            if self.depth == 0:
+                if ch == "{":
+                    self.buffer, self.depth = ["{"], 1
+                continue
+            self.buffer.append(ch)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        found.append(json.loads("".join(self.buffer)))
+                    except ValueError:
+                        found.append(None)
+        return found
+
+
+def validate_task(item, users):
+    """Returns a clean {Project, Task Name, Assignee} record, or None if ``item`` is unusable.
+
+    Project and Task Name must be non-empty text. An Assignee who is not one
+    of ``users`` becomes "Unassigned".
+    """
+    if not isinstance(item, dict):
+        return None
+    project, name, assignee = (str(item.get(k) or "").strip() for k in ("Project", "Task Name", "Assignee"))
+    if not project or not name or any(isinstance(item.get(k), (dict, list)) for k in ("Project", "Task Name")):
+        return None
+    return {"Project": project, "Task Name": name, "Assignee": assignee if assignee in users else "Unassigned"}
+
+
+def stream_tasks(api_key, parts, users, use_cache=True, on_skip=None):
+    """Streams a task-list request and yields each valid task record as soon as it is complete.
+
+    ``on_skip`` is called once for every malformed or invalid item.
+    """
+    scanner = ObjectScanner()
+    for piece in stream_text(api_key, parts, use_cache):
+        for item in scanner.feed(piece):
+            record = validate_task(item, users)
+            if record is not None:
+                yield record
+            elif on_skip:
+                on_skip()
+
+
+class TaskStream:
+    """A task-list request streaming on the worker pool.
+
+    ``items`` grows as records arrive and can be read from any thread while
+    ``done`` is False; ``error`` holds the AIError if the request failed.
+    """
+
+    def __init__(self, api_key, parts, users, use_cache=True):
+        self.items, self.skipped, self.error, self.done = [], 0, None, False
+        self._future = _pool.submit(self._run, api_key, parts, list(users), use_cache)
+
+    def _skip(self):
+        self.skipped += 1
+
+    def _run(self, api_key, parts, users, use_cache):
+        try:
+            for record in stream_tasks(api_key, parts, users, use_cache, on_skip=self._skip):
+                self.items.append(record)
+        except AIError as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def wait(self):
+        """Blocks until the request has finished."""
+        self._future.result()
+
+
+def submit_tasks(api_key, parts, users, use_cache=True):
+    """Starts streaming a task-list request and returns its :class:`TaskStream`."""
+    return TaskStream(api_key, parts, users, use_cache)
+
+
+class MergedTaskStream:
+    """Several task streams (e.g. one per document page) read as one.
+
+    ``items`` merges their records in request order, keeping the first of any
+    task that appears under the same project and name on several pages.
+    """
+
+    def __init__(self, streams):
+        self.streams = streams
+
+    @property
+    def items(self):
+        merged, seen = [], set()
+        for stream in self.streams:
+            for record in list(stream.items):
+                key = (record["Project"], record["Task Name"].lower())
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(record)
+        return merged
+
+    @property
+    def skipped(self):
+        return sum(stream.skipped for stream in self.streams)
+
+    @property
+    def error(self):
+        return next((stream.error for stream in self.streams if stream.error), None)
+
+    @property
+    def done(self):
+        return all(stream.done for stream in self.streams)
+
+    def wait(self):
+        for stream in self.streams:
+            stream.wait()
+
+
+def submit_task_batches(api_key, parts_list, users, use_cache=True):
+    """Streams one task-list request per entry of ``parts_list`` concurrently and merges the results."""
+    return MergedTaskStream([TaskStream(api_key, parts, users, use_cache) for parts in parts_list])
@@ -0,0 +1,120 @@
+"""Content-addressed attachment store for the Badiri App.
+
+File bytes live under ``attachments/`` named by their SHA-256, so the same
+receipt uploaded twice is stored once. The ``attachments`` table records each
+distinct file; ``attachment_links`` records which task it was attached to.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from importlib.util import find_spec
+
+import pandas as pd
+
+import badiri_store as store
+
+# Optional image support for thumbnail previews, imported on first use
+HAS_PIL = find_spec("PIL") is not None
+
+ATTACH_DIR = "attachments"
+THUMB_DIR = os.path.join(ATTACH_DIR, "thumbs")
+CHUNK_SIZE = 1024 * 1024 # Bytes copied per read while storing an upload
+THUMB_PX = 240 # Longest side of a preview image
+
+
+# --- 1. STORAGE ---
+def blob_path(sha):
+    """Returns where the bytes with digest ``sha`` are stored, fanned out by its first two characters."""
+    return os.path.join(ATTACH_DIR, sha[:2], sha)
+
+
+def save_upload(upload, name=None, mime=None):
+    """Stores a file-like upload and returns its attachment id.
+
+    The upload is copied in CHUNK_SIZE pieces into a temporary file while it
+    is hashed, then moved to its content path. If the same content is already
+    stored, the temporary copy is dropped and the existing id is returned.
+    """
+    name = name or getattr(upload, "name", "upload")
+    mime = mime or getattr(upload, "type", None) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+    digest, size = hashlib.sha256(), 0
+    os.makedirs(ATTACH_DIR, exist_ok=True)
+    upload.seek(0)
+    with tempfile.NamedTemporaryFile(dir=ATTACH_DIR, delete=False) as tmp:
+        for chunk in iter(lambda: upload.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            tmp.write(chunk)
+            size += len(chunk)
+    sha = digest.hexdigest()
+    try:
+        with store.transaction() as conn:
+            found = conn.execute("SELECT id FROM attachments WHERE sha256 = ?", (sha,)).fetchone()
+            if found:
+                return found[0]
+            path = blob_path(sha)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp.name, path)
+            return conn.execute(
+                "INSERT INTO attachments (sha256, size, mime_type, path, created_at) VALUES (?, ?, ?, ?, ?)",
+                (sha, size, mime, path, store.now_stamp()),
+            ).lastrowid
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+
+
+def link(table_name, task_id, attachment_id, file_name, added_by=""):
+    """Attaches a stored file to a task or subtask under ``file_name``."""
+    return store.insert_row("attachment_links", {
+        "Task Table": table_name, "Task ID": int(task_id), "Attachment ID": int(attachment_id),
+        "File Name": file_name, "Added By": added_by, "Added At": store.now_stamp(),
+    })
+
+
+# --- 2. LOOKUP & DOWNLOAD ---
+def for_task(table_name, task_id):
+    """Returns the files attached to one task or subtask, oldest first."""
+    def load():
+        with store.connect() as conn:
+            return pd.read_sql_query("""
+                SELECT l.id AS Link, l.file_name AS Name, a.sha256 AS SHA256, a.size AS Size,
+                       a.mime_type AS Mime, a.path AS Path
+                FROM attachment_links l JOIN attachments a ON a.id = l.attachment_id
+                WHERE l.task_table = ? AND l.task_id = ? ORDER BY l.id
+            """, conn, params=[table_name, int(task_id)])
+    return store.cached(("attachments", table_name, int(task_id)), ["attachment_links", "attachments"], load)
+
+
+def read_bytes(path):
+    """Reads a stored file. Pass it to a download button as a deferred callable so it only runs on click."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def human_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def thumbnail(sha, path):
+    """Returns the path of a small preview of an image attachment, creating it on first use.
+
+    Returns None when Pillow is missing or the file is not a readable image.
+    """
+    if not HAS_PIL:
+        return None
+    from PIL import Image
+    thumb = os.path.join(THUMB_DIR, f"{sha}.png")
+    if not os.path.exists(thumb):
+        try:
+            with Image.open(path) as img:
+                img.thumbnail((THUMB_PX, THUMB_PX))
+                os.makedirs(THUMB_DIR, exist_ok=True)
+                img.save(thumb, "PNG")
+        except (OSError, ValueError):
+            return None
+    return thumb
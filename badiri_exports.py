@@ -0,0 +1,140 @@
+"""Export center for the Badiri App.
+
+Exports read their source in fixed-size chunks and write each chunk straight
+into a spooled temporary file, so a large history never sits in memory as one
+DataFrame. Nothing runs until a download is requested.
+"""
+import io
+import tempfile
+from importlib.util import find_spec
+
+import pandas as pd
+
+import badiri_store as store
+
+# Optional writers: Parquet needs pyarrow, Excel needs xlsxwriter. Both are imported when an export runs.
+HAS_PARQUET = find_spec("pyarrow") is not None
+HAS_XLSX = find_spec("xlsxwriter") is not None
+
+EXPORT_CHUNK_ROWS = 5000
+SPOOL_BYTES = 8 * 1024 * 1024 # Exports larger than this spill to disk while being written
+XLSX_SHEET_ROWS = 1_048_575 # Excel's row limit, minus the header
+
+# Export name -> (tables it reads, whether it can be filtered by project)
+EXPORT_SOURCES = {
+    "Main Tasks": (["tasks"], True),
+    "Subtasks": (["subtasks"], True),
+    "Combined Tasks": (["tasks", "subtasks"], True),
+    "Task Activity": (["task_events"], False),
+    "Mail": (["mail"], False),
+}
+
+
+# --- 1. SOURCES ---
+def _source_sql(source, project):
+    tables, by_project = EXPORT_SOURCES[source]
+    where = " WHERE project = :project" if by_project and project is not None else ""
+    if source != "Combined Tasks":
+        return store.select_sql(tables[0]) + where + " ORDER BY id"
+    return f"""
+        SELECT 'Main' AS Type, id, NULL AS "Parent Task", task_name AS "Task Display", project AS Project, assignee AS Assignee,
+               status AS Status, date_added AS "Date Added", due_date AS "Due Date", comments AS Comments, attachments AS Attachments
+        FROM tasks{where}
+        UNION ALL
+        SELECT 'Sub', id, parent_task, subtask_name, project, assignee, status, date_added, due_date, comments, attachments
+        FROM subtasks{where}
+        ORDER BY Type, id
+    """
+
+
+def _column_types(source):
+    """Returns {column: SQL type} for the columns an export produces."""
+    tables, _ = EXPORT_SOURCES[source]
+    types = {"Type": "TEXT", "id": "INTEGER", "Parent Task": "TEXT", "Task Display": "TEXT"}
+    for table_name in tables:
+        types.update({display: typ.split()[0] for display, _, typ, _ in store.SCHEMAS[table_name]})
+    return types
+
+
+def iter_chunks(source, project=None, chunksize=EXPORT_CHUNK_ROWS):
+    """Yields the rows of ``source`` as DataFrames of at most ``chunksize`` rows."""
+    with store.connect() as conn:
+        yield from pd.read_sql_query(_source_sql(source, project), conn, params={"project": project}, chunksize=chunksize)
+
+
+# --- 2. WRITERS ---
+def _write_csv(source, project, out):
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    header = True
+    for chunk in iter_chunks(source, project):
+        chunk.to_csv(text, index=False, header=header)
+        header = False
+    text.flush()
+    text.detach()
+
+
+def _write_parquet(source, project, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = _column_types(source)
+    writer = None
+    for chunk in iter_chunks(source, project):
+        if writer is None:
+            schema = pa.schema([(c, pa.int64() if types.get(c) == "INTEGER" else pa.string()) for c in chunk.columns])
+            writer = pq.ParquetWriter(out, schema)
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    if writer is None:
+        writer = pq.ParquetWriter(out, pa.schema([]))
+    writer.close()
+
+
+def _write_xlsx(source, project, out):
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(out, {"constant_memory": True, "in_memory": False})
+    bold = workbook.add_format({"bold": True})
+    sheet, row, sheets = None, 0, 0
+    for chunk in iter_chunks(source, project):
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for values in chunk.itertuples(index=False, name=None):
+            if sheet is None or row > XLSX_SHEET_ROWS:
+                sheets += 1
+                sheet = workbook.add_worksheet(source[:28] if sheets == 1 else f"{source[:24]} ({sheets})")
+                sheet.write_row(0, 0, list(chunk.columns), bold)
+                row = 1
+            sheet.write_row(row, 0, values)
+            row += 1
+    if sheet is None:
+        workbook.add_worksheet(source[:28])
+    workbook.close()
+
+
+# Format name -> (writer, file extension, MIME type, available)
+EXPORT_FORMATS = {
+    "CSV": (_write_csv, "csv", "text/csv", True),
+    "Parquet": (_write_parquet, "parquet", "application/vnd.apache.parquet", HAS_PARQUET),
+    "Excel": (_write_xlsx, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", HAS_XLSX),
+}
+
+
+def available_formats():
+    """Returns the export formats whose optional writer library is installed."""
+    return [name for name, (*_, available) in EXPORT_FORMATS.items() if available]
+
+
+def export_bytes(source, fmt, project=None):
+    """Writes ``source`` in format ``fmt`` and returns the finished file's bytes.
+
+    Chunks are written to a SpooledTemporaryFile that moves to disk once it
+    passes SPOOL_BYTES, so only the finished file is ever held in memory.
+    """
+    writer = EXPORT_FORMATS[fmt][0]
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as out:
+        writer(source, project, out)
+        out.seek(0)
+        return out.read()
+
+
+def export_name(source, fmt, project=None, stamp=""):
+    """Returns the download file name for an export."""
+    parts = [source.replace(" ", "_")] + ([project.replace(" ", "_")] if project else []) + ([stamp] if stamp else [])
+    return f"{'_'.join(parts)}.{EXPORT_FORMATS[fmt][1]}"
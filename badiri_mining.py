@@ -0,0 +1,115 @@
+"""Incremental task mining over the team chat.
+
+The store keeps a watermark: the id of the last chat message already sent to
+the model. A mining run only reads messages past it, packs them into
+transcript windows of at most MINE_WINDOW_TOKENS, and streams one task-list
+request per window concurrently. When every window has answered, the results
+are de-duplicated against existing tasks and earlier suggestions, the new
+ones are stored as pending suggestions for an admin to review, and the
+watermark moves forward in the same transaction, so rerunning costs nothing
+until new messages arrive.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import badiri_ai as ai
+import badiri_store as store
+
+CHAT_SOURCE = "chat"
+MINE_WINDOW_TOKENS = 3000 # Transcript budget per request, estimated from characters
+CHARS_PER_TOKEN = 4
+MINE_READ_ROWS = 500 # Chat rows read per query while collecting new messages
+CHAT_PROMPT = "Extract tasks from chat as JSON list with keys: Project, Task Name, Assignee. Names: {users}\n\nCHAT:\n{transcript}"
+
+_mine_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="badiri-mine")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+# --- 1. WINDOWS ---
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def transcript_windows(lines, max_tokens=MINE_WINDOW_TOKENS):
+    """Packs ``(id, line)`` pairs, in order, into ``(last id, transcript)`` windows under ``max_tokens``.
+
+    A single line longer than the budget gets a window of its own.
+    """
+    windows, chunk, used = [], [], 0
+    for row_id, line in lines:
+        cost = estimate_tokens(line)
+        if chunk and used + cost > max_tokens:
+            windows.append((chunk[-1][0], "\n".join(text for _, text in chunk)))
+            chunk, used = [], 0
+        chunk.append((row_id, line))
+        used += cost
+    if chunk:
+        windows.append((chunk[-1][0], "\n".join(text for _, text in chunk)))
+    return windows
+
+
+def new_chat_lines(after_id):
+    """Returns ``(id, "User: Message")`` for every chat message past ``after_id``, oldest first."""
+    lines = []
+    while True:
+        page = store.chat_after(after_id, MINE_READ_ROWS)
+        lines += [(row_id, f"{user}: {message}") for row_id, user, message in zip(page.index, page["User"], page["Message"])]
+        if len(page) < MINE_READ_ROWS:
+            return lines
+        after_id = int(page.index[-1])
+
+
+# --- 2. MINING JOBS ---
+class MiningJob:
+    """One mining run: the window streams plus the recording step that follows them.
+
+    Reads like a :class:`badiri_ai.TaskStream`. While the windows stream,
+    ``items`` shows their merged records; once ``done``, it holds only the
+    records that were new. The watermark is left alone if any window failed,
+    so the next run retries the same messages (answered windows come from the
+    AI response cache).
+    """
+
+    def __init__(self, source, streams, last_id):
+        self.source, self.last_id = source, last_id
+        self._merged = ai.MergedTaskStream(streams)
+        self._fresh, self.error, self.done = None, None, False
+        self._future = _mine_pool.submit(self._finish)
+
+    @property
+    def items(self):
+        return self._fresh if self._fresh is not None else self._merged.items
+
+    @property
+    def skipped(self):
+        return self._merged.skipped
+
+    def _finish(self):
+        try:
+            self._merged.wait()
+            self.error = self._merged.error
+            if self.error is None:
+                self._fresh = store.record_mining(self.source, self._merged.items, self.last_id)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+
+def mine_chat(api_key, users):
+    """Starts mining the chat messages past the watermark and returns the :class:`MiningJob`.
+
+    Returns the run already in progress if there is one, or None when there
+    are no new messages.
+    """
+    with _jobs_lock:
+        job = _jobs.get(CHAT_SOURCE)
+        if job is not None and not job.done:
+            return job
+        lines = new_chat_lines(store.watermark(CHAT_SOURCE))
+        if not lines:
+            return None
+        parts = [[ai.text_part(CHAT_PROMPT.format(users=users, transcript=text))] for _, text in transcript_windows(lines)]
+        job = _jobs[CHAT_SOURCE] = MiningJob(CHAT_SOURCE, [ai.TaskStream(api_key, p, users) for p in parts], lines[-1][0])
+        return job
@@ -0,0 +1,186 @@
+"""Reporting engine for the Badiri App.
+
+Everything the Reports tab shows is derived from the ``task_rollup`` counts
+that the store keeps current on every task and subtask write. PowerPoint
+decks are built from the same data on a background worker pool.
+"""
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from importlib.util import find_spec
+
+import badiri_store as store
+
+# Optional: python-pptx is only looked up here and imported when a deck is built
+HAS_PPTX = find_spec("pptx") is not None
+
+
+# --- 1. REPORT SUMMARY ---
+def report_summary(project=None):
+    """Returns every Reports tab aggregate for one project filter (None for all).
+
+    The result is a dict with ``main_total``, ``main_completed``, ``sub_total``
+    and DataFrames ``status_counts``, ``workload``, ``project_health`` and
+    ``team_matrix``. All of them are re-shaped from
+    :func:`badiri_store.rollup_counts`, which holds at most one row per kind,
+    project, assignee and status.
+    """
+    def build():
+        counts = store.rollup_counts(project)
+        main = counts[counts["Kind"] == "Main"]
+        done = counts["Status"] == "Completed"
+        assigned = counts[counts["Assignee"] != ""] # Unassigned work stays out of the per-person views
+
+        health = main.assign(Completed=main["Count"].where(done, 0)).groupby("Project", sort=False)[["Completed", "Count"]].sum()
+        health = health.rename(columns={"Count": "Total"}).reset_index()
+        health["Pct"] = health["Completed"] / health["Total"]
+
+        matrix = assigned.assign(Completed=assigned["Count"].where(done, 0)).groupby("Assignee", sort=False)[["Count", "Completed"]].sum()
+        matrix = matrix.rename(columns={"Count": "Total Load"}).rename_axis("Team Member").reset_index()
+        matrix["Efficiency %"] = (matrix["Completed"] * 100 // matrix["Total Load"]).astype(int)
+
+        return {
+            "main_total": int(main["Count"].sum()),
+            "main_completed": int(main.loc[done, "Count"].sum()),
+            "sub_total": int(counts.loc[counts["Kind"] == "Sub", "Count"].sum()),
+            "status_counts": counts.groupby("Status", as_index=False)["Count"].sum().sort_values("Count", ascending=False),
+            "workload": assigned.groupby(["Assignee", "Status"], as_index=False)["Count"].sum().rename(columns={"Count": "Tasks"}),
+            "project_health": health,
+            "team_matrix": matrix,
+        }
+    return store.cached(("report_summary", project), ["tasks", "subtasks"], build)
+
+
+# --- 2. POWERPOINT DECK ---
+# Decks are built on a small worker pool so the Reports tab never waits on
+# python-pptx. Finished decks are shared across sessions and keyed by the
+# project filter plus the task/subtask versions they were built from.
+DECK_WORKERS = 2
+DECK_TABLE_ROWS = 12 # Overdue rows per table slide
+STATUS_ORDER = ["Pending", "In Progress", "Completed"]
+
+_deck_pool = ThreadPoolExecutor(max_workers=DECK_WORKERS, thread_name_prefix="badiri-deck")
+_decks = {}
+_decks_lock = threading.Lock()
+
+
+def _deck_key(project):
+    versions = store.table_versions()
+    return project, versions.get("tasks", 0), versions.get("subtasks", 0)
+
+
+def deck_future(project=None):
+    """Returns the Future for the current deck of ``project``, or None if none was requested."""
+    with _decks_lock:
+        return _decks.get(_deck_key(project))
+
+
+def request_deck(project=None):
+    """Starts building the deck for ``project`` unless a current one exists, and returns its Future."""
+    key = _deck_key(project)
+    with _decks_lock:
+        future = _decks.get(key)
+        if future is None or (future.done() and future.exception() is not None):
+            for stale in [k for k in _decks if k[0] == project]:
+                del _decks[stale]
+            future = _decks[key] = _deck_pool.submit(build_deck, project)
+    return future
+
+
+def _add_bullets(prs, title, lines):
+    slide = prs.slides.add_slide(prs.slide_layouts[1])
+    slide.shapes.title.text = title
+    tf = slide.shapes.placeholders[1].text_frame
+    tf.text = lines[0]
+    for line in lines[1:]:
+        tf.add_paragraph().text = line
+    return slide
+
+
+def _add_chart(prs, title, chart_type, categories, series):
+    from pptx.chart.data import CategoryChartData
+    from pptx.enum.chart import XL_LEGEND_POSITION
+    from pptx.util import Inches
+    slide = prs.slides.add_slide(prs.slide_layouts[5])
+    slide.shapes.title.text = title
+    data = CategoryChartData()
+    data.categories = categories
+    for name, values in series.items():
+        data.add_series(name, values)
+    chart = slide.shapes.add_chart(chart_type, Inches(0.5), Inches(1.5), Inches(9), Inches(5.5), data).chart
+    chart.has_legend = True
+    chart.legend.position = XL_LEGEND_POSITION.BOTTOM
+    chart.legend.include_in_layout = False
+    return chart
+
+
+def _add_tables(prs, title, frame):
+    """Adds ``frame`` as one or more table slides of at most DECK_TABLE_ROWS rows."""
+    from pptx.util import Inches, Pt
+    pages = max(1, -(-len(frame) // DECK_TABLE_ROWS))
+    for page in range(pages):
+        chunk = frame.iloc[page * DECK_TABLE_ROWS:(page + 1) * DECK_TABLE_ROWS]
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = title if pages == 1 else f"{title} ({page + 1}/{pages})"
+        table = slide.shapes.add_table(len(chunk) + 1, len(frame.columns), Inches(0.5), Inches(1.5), Inches(9), Inches(0.4) * (len(chunk) + 1)).table
+        for col, name in enumerate(frame.columns):
+            table.cell(0, col).text = str(name)
+        for row, values in enumerate(chunk.itertuples(index=False), start=1):
+            for col, value in enumerate(values):
+                table.cell(row, col).text = str(value)
+                table.cell(row, col).text_frame.paragraphs[0].font.size = Pt(11)
+
+
+def build_deck(project=None):
+    """Builds the status report deck for ``project`` (None for all projects) and returns the .pptx bytes."""
+    from pptx import Presentation
+    from pptx.enum.chart import XL_CHART_TYPE
+    summary = report_summary(project)
+    counts = store.rollup_counts(project)
+    today = store.today_day()
+    overdue = store.open_deadlines(max_day=today - 1, projects=None if project is None else [project])
+    overdue = overdue[["Project", "Task Display", "Assignee", "Due Date"]].assign(**{"Days Overdue": today - overdue["Due Day"]})
+
+    prs = Presentation()
+    title_slide = prs.slides.add_slide(prs.slide_layouts[0])
+    title_slide.shapes.title.text = "Badiri App Status Report"
+    title_slide.placeholders[1].text = f"Marumo Technologies - {project or 'All Projects'}\nGenerated on {datetime.now().strftime('%Y-%m-%d')}"
+
+    main_status = counts[counts["Kind"] == "Main"].groupby("Status")["Count"].sum()
+    _add_bullets(prs, "Executive Summary", [
+        f"Total Main Tasks: {summary['main_total']}",
+        f"✅ Completed Tasks: {summary['main_completed']}",
+        f"🚀 In Progress Tasks: {int(main_status.get('In Progress', 0))}",
+        f"⏳ Pending Tasks: {int(main_status.get('Pending', 0))}",
+        f"Subtasks: {summary['sub_total']}",
+        f"🚨 Overdue Items: {len(overdue)}",
+    ])
+
+    if not summary["status_counts"].empty:
+        status = summary["status_counts"]
+        _add_chart(prs, "Task Status Distribution", XL_CHART_TYPE.PIE, status["Status"].tolist(), {"Tasks": status["Count"].tolist()})
+    if not summary["workload"].empty:
+        workload = summary["workload"].pivot_table(index="Assignee", columns="Status", values="Tasks", aggfunc="sum", fill_value=0)
+        statuses = [s for s in STATUS_ORDER if s in workload.columns] + [s for s in workload.columns if s not in STATUS_ORDER]
+        _add_chart(prs, "Team Workload", XL_CHART_TYPE.BAR_STACKED, workload.index.tolist(), {s: workload[s].tolist() for s in statuses})
+
+    if overdue.empty:
+        _add_bullets(prs, "Overdue Tasks", ["✅ No tasks are currently overdue."])
+    else:
+        _add_tables(prs, "Overdue Tasks", overdue)
+
+    for proj in summary["project_health"].itertuples(index=False):
+        proj_counts = counts[counts["Project"] == proj.Project]
+        by_status = proj_counts.groupby("Status")["Count"].sum()
+        team = proj_counts.groupby("Assignee")["Count"].sum().sort_values(ascending=False)
+        _add_bullets(prs, f"Project: {proj.Project}", [
+            f"Completion: {int(proj.Pct * 100)}% ({proj.Completed}/{proj.Total} Main Tasks)",
+            "Status: " + ", ".join(f"{s} {int(n)}" for s, n in by_status.items()),
+            f"🚨 Overdue Items: {int((overdue['Project'] == proj.Project).sum())}",
+            "Team: " + ", ".join(f"{a} ({int(n)})" for a, n in team.items() if a),
+        ])
+
+    stream = io.BytesIO()
+    prs.save(stream)
+    return stream.getvalue()
@@ -0,0 +1,104 @@
+"""Deadline digests for the Badiri App.
+
+Once a day every active user with open work that is overdue or due within
+UPCOMING_DAYS gets one internal mail listing it. The query is bounded: at most
+DIGEST_ITEMS rows per user and section are read, with a count of the rest.
+Sends are logged per user and day in the same transaction as the mail, so
+running the job again (or from several processes at once) sends nothing new.
+
+Run it standalone next to the database::
+
+    python badiri_scheduler.py            # every INTERVAL_SECONDS until stopped
+    python badiri_scheduler.py --once     # one pass, e.g. from cron
+
+or in-process with :func:`start`, which the app calls on startup.
+"""
+import argparse
+import logging
+import threading
+from datetime import timedelta
+
+import badiri_store as store
+
+DIGEST_SENDER = "Badiri Scheduler"
+UPCOMING_DAYS = 7
+DIGEST_ITEMS = 20 # Rows listed per user and section; the rest are counted
+INTERVAL_SECONDS = 3600
+
+log = logging.getLogger("badiri.scheduler")
+_thread = None
+_thread_lock = threading.Lock()
+
+
+# --- 1. DIGESTS ---
+def _section_lines(rows, title, day):
+    total = int(rows["Total"].iloc[0])
+    lines = [f"{title} ({total}):"]
+    for row in rows.to_dict("records"):
+        offset = int(row["Due Day"]) - day
+        when = f"{-offset} day(s) overdue" if offset < 0 else "due today" if offset == 0 else f"due in {offset} day(s)"
+        lines.append(f"- [{row['Project']}] {'[Sub] ' if row['Type'] == 'Sub' else ''}{row['Task Display']} ({row['Due Date']}, {when})")
+    if total > len(rows):
+        lines.append(f"...and {total - len(rows)} more.")
+    return lines
+
+
+def build_digests(day):
+    """Returns ``{recipient: (subject, message)}`` for everyone with deadlines to hear about on epoch ``day``."""
+    rows = store.deadline_digest(day, UPCOMING_DAYS, DIGEST_ITEMS)
+    stamp = (store.EPOCH + timedelta(days=day)).strftime("%d %b %Y")
+    digests = {}
+    for recipient, mine in rows.groupby("Recipient", sort=False):
+        lines = [f"Hello {recipient}, here is your deadline summary for {stamp}.", ""]
+        for section, title in (("Overdue", "🚨 Overdue"), ("Upcoming", f"📅 Due in the next {UPCOMING_DAYS} days")):
+            part = mine[mine["Section"] == section]
+            if not part.empty:
+                lines += _section_lines(part, title, day) + [""]
+        digests[recipient] = (f"📬 Deadline digest - {stamp}", "\n".join(lines).strip())
+    return digests
+
+
+def run_once(day=None):
+    """Builds and sends today's digests (or those for epoch ``day``) and returns how many were sent."""
+    day = store.today_day() if day is None else day
+    sent = store.send_digests(day, build_digests(day), DIGEST_SENDER)
+    log.info("Sent %d deadline digest(s) for day %d", sent, day)
+    return sent
+
+
+# --- 2. RUNNERS ---
+def _loop(interval, stop):
+    while True:
+        try:
+            run_once()
+        except Exception:
+            log.exception("Deadline digest run failed")
+        if stop.wait(interval):
+            return
+
+
+def start(interval=INTERVAL_SECONDS):
+    """Starts the digest loop on a daemon thread, once per process. Returns the thread."""
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_loop, args=(interval, threading.Event()), name="badiri-scheduler", daemon=True)
+            _thread.start()
+        return _thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mail daily deadline digests to Badiri App users.")
+    parser.add_argument("--once", action="store_true", help="send today's digests and exit")
+    parser.add_argument("--interval", type=int, default=INTERVAL_SECONDS, help="seconds between runs (default %(default)s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    store.init_db_migration()
+    if args.once:
+        run_once()
+    else:
+        _loop(args.interval, threading.Event())
+
+
+if __name__ == "__main__":
+    main()
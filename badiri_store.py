@@ -0,0 +1,1272 @@
+"""SQLite persistence engine for the Badiri App.
+
+Every table has a typed schema with an integer primary key, and the app
+reads and writes single rows by id instead of rewriting whole tables.
+"""
+import hashlib
+import mimetypes
+import os
+import queue
+import sqlite3
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pandas as pd
+
+DB_NAME = "badiri_backend.db"
+
+# --- 1. TABLE SCHEMAS ---
+# Each column is (display name used by the UI, SQL column, SQL type, default).
+# A default of None makes the column nullable, which is used for foreign keys.
+SCHEMAS = {
+    "tasks": [
+        ("Project", "project", "TEXT", ""),
+        ("Task Name", "task_name", "TEXT", ""),
+        ("Assignee", "assignee", "TEXT", ""),
+        ("Status", "status", "TEXT", "Pending"),
+        ("Date Added", "date_added", "TEXT", ""),
+        ("Due Date", "due_date", "TEXT", ""),
+        ("Comments", "comments", "TEXT", ""),
+        ("Attachments", "attachments", "TEXT", ""),
+        ("Row Version", "row_version", "INTEGER", 0),
+        ("Added Day", "added_day", "INTEGER", None),
+        ("Due Day", "due_day", "INTEGER", None),
+        ("Date Added Raw", "date_added_raw", "TEXT", ""),
+        ("Due Date Raw", "due_date_raw", "TEXT", ""),
+    ],
+    "subtasks": [
+        ("Project", "project", "TEXT", ""),
+        ("Parent Task", "parent_task", "TEXT", ""),
+        ("Parent Task ID", "parent_task_id", "INTEGER REFERENCES tasks(id) ON DELETE CASCADE", None),
+        ("Subtask Name", "subtask_name", "TEXT", ""),
+        ("Assignee", "assignee", "TEXT", ""),
+        ("Status", "status", "TEXT", "Pending"),
+        ("Date Added", "date_added", "TEXT", ""),
+        ("Due Date", "due_date", "TEXT", ""),
+        ("Comments", "comments", "TEXT", ""),
+        ("Attachments", "attachments", "TEXT", ""),
+        ("Row Version", "row_version", "INTEGER", 0),
+        ("Added Day", "added_day", "INTEGER", None),
+        ("Due Day", "due_day", "INTEGER", None),
+        ("Date Added Raw", "date_added_raw", "TEXT", ""),
+        ("Due Date Raw", "due_date_raw", "TEXT", ""),
+    ],
+    "users": [
+        ("Full Name", "full_name", "TEXT", ""),
+        ("Email", "email", "TEXT", ""),
+        ("Phone Number", "phone_number", "TEXT", ""),
+        ("Status", "status", "TEXT", "Active"),
+        ("Role", "role", "TEXT", "Standard"),
+        ("Password", "password", "TEXT", "1234"),
+    ],
+    "chat": [
+        ("Timestamp", "timestamp", "TEXT", ""),
+        ("User", "user", "TEXT", ""),
+        ("Message", "message", "TEXT", ""),
+    ],
+    "mail": [
+        ("Timestamp", "timestamp", "TEXT", ""),
+        ("From", "sender", "TEXT", ""),
+        ("To", "recipient", "TEXT", ""),
+        ("Subject", "subject", "TEXT", ""),
+        ("Message", "message", "TEXT", ""),
+        ("Read", "read", "TEXT", "No"),
+        ("Thread Key", "thread_key", "TEXT", ""),
+    ],
+    # Append-only activity log; "Task Table" is "tasks" or "subtasks".
+    "task_events": [
+        ("Task Table", "task_table", "TEXT", ""),
+        ("Task ID", "task_id", "INTEGER", 0),
+        ("Actor", "actor", "TEXT", ""),
+        ("Action", "action", "TEXT", ""),
+        ("Note", "note", "TEXT", ""),
+        ("Created At", "created_at", "TEXT", ""),
+    ],
+    # One row per distinct file content; "Path" is where the bytes live.
+    "attachments": [
+        ("SHA256", "sha256", "TEXT", ""),
+        ("Size", "size", "INTEGER", 0),
+        ("MIME Type", "mime_type", "TEXT", ""),
+        ("Path", "path", "TEXT", ""),
+        ("Created At", "created_at", "TEXT", ""),
+    ],
+    # Which task or subtask a file was attached to, under which name.
+    "attachment_links": [
+        ("Task Table", "task_table", "TEXT", ""),
+        ("Task ID", "task_id", "INTEGER", 0),
+        ("Attachment ID", "attachment_id", "INTEGER REFERENCES attachments(id)", None),
+        ("File Name", "file_name", "TEXT", ""),
+        ("Added By", "added_by", "TEXT", ""),
+        ("Added At", "added_at", "TEXT", ""),
+    ],
+    # How far each AI mining source (e.g. "chat") has been analyzed, by row id.
+    "ai_watermarks": [
+        ("Source", "source", "TEXT", ""),
+        ("Last ID", "last_id", "INTEGER", 0),
+        ("Updated At", "updated_at", "TEXT", ""),
+    ],
+    # Every task an AI mining run has already suggested; "Task Key" is the lowercased name.
+    # "Status" is "Pending" until an admin approves or dismisses the suggestion.
+    "ai_suggestions": [
+        ("Source", "source", "TEXT", ""),
+        ("Project", "project", "TEXT", ""),
+        ("Task Name", "task_name", "TEXT", ""),
+        ("Assignee", "assignee", "TEXT", ""),
+        ("Task Key", "task_key", "TEXT", ""),
+        ("Created At", "created_at", "TEXT", ""),
+        ("Status", "status", "TEXT", "Pending"),
+    ],
+    # One row per deadline digest mailed; "Digest Day" is the epoch day it covers.
+    "digest_log": [
+        ("Recipient", "recipient", "TEXT", ""),
+        ("Digest Day", "digest_day", "INTEGER", 0),
+        ("Mail ID", "mail_id", "INTEGER", 0),
+        ("Created At", "created_at", "TEXT", ""),
+    ],
+}
+
+INDEXES = {
+    "idx_tasks_project": "tasks (project)",
+    "idx_tasks_assignee_status": "tasks (assignee, status)",
+    "idx_subtasks_project": "subtasks (project)",
+    "idx_subtasks_assignee_status": "subtasks (assignee, status)",
+    "idx_subtasks_parent": "subtasks (parent_task_id)",
+    "idx_tasks_due_day": "tasks (due_day)",
+    "idx_subtasks_due_day": "subtasks (due_day)",
+    "idx_task_events_task": "task_events (task_table, task_id, id)",
+    "idx_task_events_actor": "task_events (actor, task_table, task_id)",
+    "idx_mail_recipient": "mail (recipient, id)",
+    "idx_mail_inbox": "mail (recipient, read, id)",
+    "idx_mail_thread": "mail (thread_key, id)",
+    "idx_mail_sender": "mail (sender, id)",
+    "idx_attachments_sha256": "attachments (sha256)",
+    "idx_attachment_links_task": "attachment_links (task_table, task_id, id)",
+    "idx_ai_watermarks_source": "ai_watermarks (source)",
+    "idx_ai_suggestions_key": "ai_suggestions (project, task_key)",
+    "idx_ai_suggestions_pending": "ai_suggestions (source, status, id)",
+    "idx_digest_log_day": "digest_log (digest_day, recipient)",
+    "idx_tasks_board": "tasks (project, status, due_day)",
+}
+
+# Free-form date columns and the integer day column (days since 1970-01-01)
+# that is derived from them whenever they are written.
+DATE_COLUMNS = {"Date Added": "Added Day", "Due Date": "Due Day"}
+# Where the original text of a date column is kept when it can't be read as a date.
+RAW_DATE_COLUMNS = {"Date Added": "Date Added Raw", "Due Date": "Due Date Raw"}
+BLANK_DATES = ("", "nan", "nat", "none")
+EPOCH = date(1970, 1, 1)
+
+# Rows shown per page of a task's activity history.
+EVENTS_PAGE_SIZE = 5
+
+# Full timestamps for chat messages and activity, sortable as text.
+STAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHAT_PAGE_SIZE = 20
+MAIL_PAGE_SIZE = 20
+
+# Reply/forward prefixes dropped from a subject to find its thread.
+THREAD_PREFIXES = ("re:", "fw:", "fwd:")
+
+# Full-text search sources: table -> (code, title, body, project, columns that
+# feed the index). ``{r}`` stands for the row (NEW/OLD in triggers). Index
+# rowids are ``id * 8 + code`` so a source row maps to exactly one entry.
+SEARCH_SOURCES = {
+    "tasks": (1, "{r}.task_name", "{r}.comments", "{r}.project", "task_name, comments, project"),
+    "subtasks": (2, "{r}.subtask_name", "{r}.comments", "{r}.project", "subtask_name, comments, project"),
+    "task_events": (
+        3, "{r}.actor || ' ' || {r}.action", "{r}.note",
+        "coalesce((SELECT project FROM tasks WHERE {r}.task_table = 'tasks' AND id = {r}.task_id),"
+        " (SELECT project FROM subtasks WHERE {r}.task_table = 'subtasks' AND id = {r}.task_id), '')",
+        "actor, action, note",
+    ),
+    "chat": (4, "{r}.user", "{r}.message", "''", "user, message"),
+    "mail": (5, "{r}.subject", "{r}.message", "''", "subject, message"),
+}
+SEARCH_PAGE_SIZE = 10
+
+# Project Board: cards per status column and page, and the orders it can sort by.
+BOARD_PAGE_SIZE = 10
+BOARD_SORTS = {
+    "Due date": "due_day IS NULL, due_day, id",
+    "Newest": "id DESC",
+    "Name": "task_name COLLATE NOCASE, id",
+    "Assignee": "assignee COLLATE NOCASE, due_day IS NULL, due_day, id",
+}
+
+# Connection tuning. Every pooled connection runs in WAL mode so readers never
+# block the single writer, and waits for locks instead of failing immediately.
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+WRITE_RETRIES = 5
+PRAGMAS = (
+    "journal_mode = WAL",
+    "synchronous = NORMAL",
+    "cache_size = -8000",
+    "mmap_size = 134217728",
+    "temp_store = MEMORY",
+    "foreign_keys = ON",
+    f"busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+
+# Maximum number of cached snapshots and query results shared by all sessions.
+CACHE_SIZE = 64
+
+# Legacy CSV exports that are imported once into an empty table.
+CSV_SEEDS = {
+    "tasks": "badiri_db.csv",
+    "subtasks": "badiri_subtasks.csv",
+    "users": "badiri_users.csv",
+    "chat": "badiri_chat.csv",
+    "mail": "badiri_mail.csv",
+}
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def select_sql(table_name):
+    """Returns a SELECT of ``table_name`` with its columns aliased to their display names."""
+    cols = ", ".join(f"{_q(sql)} AS {_q(display)}" for display, sql, _, _ in SCHEMAS[table_name])
+    return f"SELECT id, {cols} FROM {_q(table_name)}"
+
+
+def _lenient_date(text):
+    """Reads ``text`` with pandas' date parser, then day first ("24/02/2026"); None if neither can."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for dayfirst in (False, True):
+            try:
+                stamp = pd.to_datetime(text, dayfirst=dayfirst)
+            except (ValueError, TypeError, OverflowError):
+                continue
+            if not pd.isna(stamp):
+                return stamp.date()
+    return None
+
+
+def parse_day(value):
+    """Normalizes a date-like value to ``(ISO date string, epoch day)``.
+
+    ISO dates are read directly and other formats leniently. Anything that is
+    still not a recognisable date (blank, "Unknown", garbage) becomes
+    ``("", None)`` so it sorts as "no due date" instead of failing.
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        text = str(value).strip()
+        try:
+            value = date.fromisoformat(text[:10])
+        except ValueError:
+            value = _lenient_date(text) if text.lower() not in BLANK_DATES else None
+            if value is None:
+                return "", None
+    return value.isoformat(), (value - EPOCH).days
+
+
+def today_day():
+    return (date.today() - EPOCH).days
+
+
+def now_stamp():
+    return datetime.now().strftime(STAMP_FORMAT)
+
+
+def thread_key(subject):
+    """Returns the thread a mail subject belongs to: lowercased, without Re:/Fwd: prefixes."""
+    key = " ".join(str(subject).split()).lower()
+    while key.startswith(THREAD_PREFIXES):
+        key = key.split(":", 1)[1].strip()
+    return key
+
+
+def _with_derived(table_name, values):
+    """Normalizes date columns in ``values`` and adds the columns derived from them."""
+    displays = {display for display, _, _, _ in SCHEMAS[table_name]}
+    values = dict(values)
+    for col, day_col in DATE_COLUMNS.items():
+        if col in values and day_col in displays:
+            raw = "" if values[col] is None else str(values[col]).strip()
+            values[col], values[day_col] = parse_day(values[col])
+            if RAW_DATE_COLUMNS[col] in displays:
+                values[RAW_DATE_COLUMNS[col]] = raw if values[day_col] is None and raw.lower() not in BLANK_DATES else ""
+    if "Subject" in values and "Thread Key" in displays:
+        values["Thread Key"] = thread_key(values["Subject"])
+    return values
+
+
+def _sql_columns(table_name, values):
+    mapping = {display: sql for display, sql, _, _ in SCHEMAS[table_name]}
+    try:
+        return [mapping[col] for col in values]
+    except KeyError as e:
+        raise KeyError(f"Unknown column {e.args[0]!r} for table '{table_name}'") from None
+
+
+# --- 2. CONNECTIONS ---
+# Connections are pooled per database file and shared between Streamlit's
+# script threads, so they run in autocommit mode and writers open explicit
+# transactions through transaction().
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool():
+    with _pools_lock:
+        return _pools.setdefault(os.path.abspath(DB_NAME), queue.LifoQueue(maxsize=POOL_SIZE))
+
+
+def _open_connection():
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+
+def _is_locked(error):
+    return "locked" in str(error) or "busy" in str(error)
+
+
+@contextmanager
+def connect():
+    """Yields a pooled autocommit connection for reads."""
+    pool = _pool()
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open_connection()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def _retry_locked(conn, statement):
+    for attempt in range(WRITE_RETRIES):
+        try:
+            return conn.execute(statement)
+        except sqlite3.OperationalError as e:
+            if not _is_locked(e) or attempt == WRITE_RETRIES - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+@contextmanager
+def transaction():
+    """Yields a pooled connection inside a write transaction.
+
+    The write lock is taken up front with BEGIN IMMEDIATE, so lock contention
+    surfaces before any statement runs and is retried with backoff on top of
+    the connection's busy timeout. Commits on success, rolls back on error.
+    """
+    with connect() as conn:
+        _retry_locked(conn, "BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        _retry_locked(conn, "COMMIT")
+
+
+# --- 3. MIGRATIONS ---
+def _table_columns(conn, table_name):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({_q(table_name)})")]
+
+
+def _column_def(sql, typ, default):
+    if default is None:
+        return f"{_q(sql)} {typ}"
+    return f"{_q(sql)} {typ} NOT NULL DEFAULT {_literal(default)}"
+
+
+def _create_table(conn, table_name):
+    cols = ", ".join(_column_def(sql, typ, default) for _, sql, typ, default in SCHEMAS[table_name])
+    conn.execute(f"CREATE TABLE {_q(table_name)} (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols})")
+
+
+def _add_missing_columns(conn, table_name):
+    existing = set(_table_columns(conn, table_name))
+    for _, sql, typ, default in SCHEMAS[table_name]:
+        if sql not in existing:
+            conn.execute(f"ALTER TABLE {_q(table_name)} ADD COLUMN {_column_def(sql, typ, default)}")
+
+
+def _literal(value):
+    if isinstance(value, int):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _adopt_legacy_table(conn, table_name):
+    """Rebuilds a table written by ``DataFrame.to_sql`` into its typed schema."""
+    legacy = f"{table_name}_legacy"
+    legacy_cols = set(_table_columns(conn, table_name))
+    conn.execute(f"ALTER TABLE {_q(table_name)} RENAME TO {_q(legacy)}")
+    _create_table(conn, table_name)
+    shared = [(display, sql, default) for display, sql, _, default in SCHEMAS[table_name] if display in legacy_cols and default is not None]
+    if shared:
+        targets = ", ".join(_q(sql) for _, sql, _ in shared)
+        sources = ", ".join(f"COALESCE(CAST({_q(display)} AS TEXT), {_literal(default)})" for display, _, default in shared)
+        conn.execute(f"INSERT INTO {_q(table_name)} ({targets}) SELECT {sources} FROM {_q(legacy)} ORDER BY rowid")
+    conn.execute(f"DROP TABLE {_q(legacy)}")
+
+
+def _import_csv(conn, table_name, csv_file):
+    raw = pd.read_csv(csv_file, dtype=str)
+    schema = [(display, sql, default) for display, sql, _, default in SCHEMAS[table_name] if display in raw.columns and default is not None]
+    if not schema or raw.empty:
+        return
+    rows = [
+        tuple(default if pd.isna(val) else val for val, (_, _, default) in zip(rec, schema))
+        for rec in raw[[display for display, _, _ in schema]].itertuples(index=False, name=None)
+    ]
+    cols = ", ".join(_q(sql) for _, sql, _ in schema)
+    marks = ", ".join("?" for _ in schema)
+    conn.executemany(f"INSERT INTO {_q(table_name)} ({cols}) VALUES ({marks})", rows)
+
+
+def _migrate_v1(conn):
+    """Typed tables with primary keys, adopting legacy tables and CSV seeds."""
+    imported = []
+    for table_name in SCHEMAS:
+        cols = _table_columns(conn, table_name)
+        if cols and "id" not in cols:
+            _adopt_legacy_table(conn, table_name)
+        elif not cols:
+            _create_table(conn, table_name)
+        csv_file = CSV_SEEDS.get(table_name)
+        if csv_file and os.path.exists(csv_file):
+            empty = conn.execute(f"SELECT count(*) FROM {_q(table_name)}").fetchone()[0] == 0
+            if empty:
+                _import_csv(conn, table_name, csv_file)
+                imported.append(csv_file)
+    return imported
+
+
+def _version_triggers(conn, table_name):
+    conn.execute("INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)", (table_name,))
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {_q(f"trg_{table_name}_{event.lower()}_version")}
+            AFTER {event} ON {_q(table_name)} FOR EACH ROW BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE table_name = {_literal(table_name)};
+            END
+        """)
+
+
+# Rollups are summary tables kept current by triggers, so they change in the
+# same transaction as the rows they summarize. ``task_rollup`` counts tasks
+# ("Main") and subtasks ("Sub") per project, assignee and status;
+# ``mail_unread`` counts unread mail per recipient.
+ROLLUP_KINDS = {"tasks": "Main", "subtasks": "Sub"}
+
+
+def _rollup_triggers(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS task_rollup (
+            kind TEXT NOT NULL, project TEXT NOT NULL, assignee TEXT NOT NULL, status TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (kind, project, assignee, status)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS mail_unread (recipient TEXT PRIMARY KEY, unread INTEGER NOT NULL DEFAULT 0)")
+    for table_name, kind in ROLLUP_KINDS.items():
+        add = f"""
+            INSERT INTO task_rollup (kind, project, assignee, status, count) VALUES ({_literal(kind)}, NEW.project, NEW.assignee, NEW.status, 1)
+            ON CONFLICT (kind, project, assignee, status) DO UPDATE SET count = count + 1;
+        """
+        remove = f"""
+            UPDATE task_rollup SET count = count - 1
+            WHERE kind = {_literal(kind)} AND project = OLD.project AND assignee = OLD.assignee AND status = OLD.status;
+            DELETE FROM task_rollup
+            WHERE kind = {_literal(kind)} AND project = OLD.project AND assignee = OLD.assignee AND status = OLD.status AND count <= 0;
+        """
+        for event, body in (("INSERT", add), ("UPDATE OF project, assignee, status", remove + add), ("DELETE", remove)):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {_q(f"trg_{table_name}_{event.split()[0].lower()}_rollup")}
+                AFTER {event} ON {_q(table_name)} FOR EACH ROW BEGIN {body} END
+            """)
+    add = """
+        INSERT INTO mail_unread (recipient, unread) SELECT NEW.recipient, 1 WHERE NEW.read = 'No'
+        ON CONFLICT (recipient) DO UPDATE SET unread = unread + 1;
+    """
+    remove = """
+        UPDATE mail_unread SET unread = unread - 1 WHERE recipient = OLD.recipient AND OLD.read = 'No';
+        DELETE FROM mail_unread WHERE recipient = OLD.recipient AND unread <= 0;
+    """
+    for event, body in (("INSERT", add), ("UPDATE OF recipient, read", remove + add), ("DELETE", remove)):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {_q(f"trg_mail_{event.split()[0].lower()}_rollup")}
+            AFTER {event} ON mail FOR EACH ROW BEGIN {body} END
+        """)
+
+
+def _rebuild_rollups(conn):
+    """Recomputes every rollup table from the raw rows."""
+    conn.execute("DELETE FROM task_rollup")
+    for table_name, kind in ROLLUP_KINDS.items():
+        conn.execute(f"""
+            INSERT INTO task_rollup (kind, project, assignee, status, count)
+            SELECT {_literal(kind)}, project, assignee, status, count(*) FROM {_q(table_name)} GROUP BY project, assignee, status
+        """)
+    conn.execute("DELETE FROM mail_unread")
+    conn.execute("INSERT INTO mail_unread (recipient, unread) SELECT recipient, count(*) FROM mail WHERE read = 'No' GROUP BY recipient")
+
+
+def _search_triggers(conn):
+    """Creates the FTS5 search index and its triggers. Skipped when SQLite lacks FTS5."""
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                title, body, source UNINDEXED, project UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return
+    for table_name, (code, title, body, project, cols) in SEARCH_SOURCES.items():
+        add = f"""
+            INSERT INTO search_index (rowid, title, body, source, project)
+            VALUES (NEW.id * 8 + {code}, {title.format(r="NEW")}, {body.format(r="NEW")}, {_literal(table_name)}, {project.format(r="NEW")});
+        """
+        remove = f"DELETE FROM search_index WHERE rowid = OLD.id * 8 + {code};"
+        for event, body_sql in (("INSERT", add), (f"UPDATE OF {cols}", remove + add), ("DELETE", remove)):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {_q(f"trg_{table_name}_{event.split()[0].lower()}_search")}
+                AFTER {event} ON {_q(table_name)} FOR EACH ROW BEGIN {body_sql} END
+            """)
+
+
+def _rebuild_search(conn):
+    """Re-indexes every searchable row."""
+    if not _table_columns(conn, "search_index"):
+        return
+    conn.execute("DELETE FROM search_index")
+    for table_name, (code, title, body, project, _) in SEARCH_SOURCES.items():
+        conn.execute(f"""
+            INSERT INTO search_index (rowid, title, body, source, project)
+            SELECT r.id * 8 + {code}, {title.format(r="r")}, {body.format(r="r")}, {_literal(table_name)}, {project.format(r="r")}
+            FROM {_q(table_name)} r
+        """)
+
+
+def _sync_schema(conn):
+    """Creates any missing tables, columns, indexes, version, rollup and search triggers."""
+    conn.execute("CREATE TABLE IF NOT EXISTS table_versions (table_name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)")
+    for table_name in SCHEMAS:
+        if not _table_columns(conn, table_name):
+            _create_table(conn, table_name)
+        _add_missing_columns(conn, table_name)
+        _version_triggers(conn, table_name)
+    for name, target in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    _rollup_triggers(conn)
+    _search_triggers(conn)
+
+
+def _migrate_v2(conn):
+    """Links subtasks to their parent by id and indexes the hot lookup paths."""
+    _sync_schema(conn)
+    conn.execute("""
+        UPDATE subtasks SET parent_task_id = (
+            SELECT min(t.id) FROM tasks t
+            WHERE t.project = subtasks.project AND t.task_name = subtasks.parent_task
+        ) WHERE parent_task_id IS NULL
+    """)
+
+
+def _migrate_v3(conn):
+    """Per-table version counters, bumped by triggers on every write."""
+    _sync_schema(conn)
+
+
+def _migrate_v4(conn):
+    """Row versions on tasks and subtasks for optimistic concurrency control."""
+    _sync_schema(conn)
+
+
+def _migrate_v5(conn):
+    """Activity log table, seeded so pending tasks already acknowledged in their Comments stay out of the inbox."""
+    _sync_schema(conn)
+    for table_name in ("tasks", "subtasks"):
+        conn.execute(f"""
+            INSERT INTO task_events (task_table, task_id, actor, action, note, created_at)
+            SELECT {_literal(table_name)}, id, assignee, 'ACKNOWLEDGED', 'Carried over from legacy comments', date_added
+            FROM {_q(table_name)} WHERE assignee <> '' AND instr(comments, assignee) > 0
+        """)
+
+
+def _migrate_v6(conn):
+    """Normalized ISO dates plus indexed integer day columns on tasks and subtasks; unreadable dates keep their text."""
+    _sync_schema(conn)
+    for table_name in ("tasks", "subtasks"):
+        rows = conn.execute(f"SELECT id, date_added, due_date FROM {table_name}").fetchall()
+        updates = [(row_id, _with_derived(table_name, {"Date Added": added, "Due Date": due})) for row_id, added, due in rows]
+        if updates:
+            cols = _sql_columns(table_name, updates[0][1])
+            conn.executemany(
+                f"UPDATE {table_name} SET {', '.join(f'{_q(c)} = ?' for c in cols)} WHERE id = ?",
+                [(*values.values(), row_id) for row_id, values in updates],
+            )
+
+
+def _migrate_v7(conn):
+    """Trigger-maintained rollups of task counts and unread mail."""
+    _sync_schema(conn)
+    _rebuild_rollups(conn)
+
+
+def _legacy_stamp(value, last):
+    """Reads a legacy chat timestamp ("12:05", "24 Feb 12:05" or ISO) as a datetime.
+
+    Missing dates are taken from ``last``, the previous message's time, since
+    chat rows were always appended in order.
+    """
+    value = str(value).strip()
+    for fmt, fill in ((STAMP_FORMAT, None), ("%Y-%m-%d %H:%M", None), ("%d %b %H:%M", "year"), ("%H:%M", "date")):
+        try:
+            stamp = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fill == "year":
+            stamp = stamp.replace(year=last.year)
+        elif fill == "date":
+            stamp = datetime.combine(last.date(), stamp.time())
+        return stamp
+    return last
+
+
+def _migrate_v8(conn):
+    """Full, sortable timestamps on chat messages."""
+    _sync_schema(conn)
+    last = datetime.now().replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    updates = []
+    for row_id, value in conn.execute("SELECT id, timestamp FROM chat ORDER BY id").fetchall():
+        last = _legacy_stamp(value, last)
+        updates.append((last.strftime(STAMP_FORMAT), row_id))
+    conn.executemany("UPDATE chat SET timestamp = ? WHERE id = ?", updates)
+
+
+def _migrate_v9(conn):
+    """Mail thread keys plus the inbox and thread indexes."""
+    _sync_schema(conn)
+    rows = conn.execute("SELECT id, subject FROM mail").fetchall()
+    conn.executemany("UPDATE mail SET thread_key = ? WHERE id = ?", [(thread_key(subject), row_id) for row_id, subject in rows])
+
+
+def _migrate_v10(conn):
+    """Full-text search index over tasks, subtasks, activity, chat and mail."""
+    _sync_schema(conn)
+    _rebuild_search(conn)
+
+
+def _file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _migrate_v11(conn):
+    """Attachment and link tables, adopting files listed in the legacy Attachments column in place."""
+    _sync_schema(conn)
+    for table_name in ("tasks", "subtasks"):
+        rows = conn.execute(f"SELECT id, attachments, date_added FROM {table_name} WHERE attachments <> ''").fetchall()
+        for task_id, paths, added in rows:
+            for path in filter(None, paths.split("|")):
+                if not os.path.isfile(path):
+                    continue
+                sha = _file_digest(path)
+                found = conn.execute("SELECT id FROM attachments WHERE sha256 = ?", (sha,)).fetchone()
+                if found:
+                    attachment_id = found[0]
+                else:
+                    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+                    attachment_id = conn.execute(
+                        "INSERT INTO attachments (sha256, size, mime_type, path, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (sha, os.path.getsize(path), mime, path, added),
+                    ).lastrowid
+                conn.execute(
+                    "INSERT INTO attachment_links (task_table, task_id, attachment_id, file_name, added_at) VALUES (?, ?, ?, ?, ?)",
+                    (table_name, task_id, attachment_id, os.path.basename(path).split("_", 1)[-1], added),
+                )
+
+
+def _migrate_v12(conn):
+    """Watermarks and suggestion history for incremental AI mining."""
+    _sync_schema(conn)
+
+
+def _migrate_v13(conn):
+    """Log of deadline digests already mailed."""
+    _sync_schema(conn)
+
+
+def _migrate_v14(conn):
+    """Project Board index by project, status and due day."""
+    _sync_schema(conn)
+
+
+def _migrate_v15(conn):
+    """Review status on AI suggestions; earlier suggestions that never became a task are pending again."""
+    _sync_schema(conn)
+    existing = _existing_task_keys(conn)
+    rows = conn.execute("SELECT id, project, task_name FROM ai_suggestions").fetchall()
+    conn.executemany("UPDATE ai_suggestions SET status = 'Approved' WHERE id = ?", [(row_id,) for row_id, project, name in rows if _task_key(project, name) in existing])
+
+
+def _migrate_v16(conn):
+    """Raw text columns for task and subtask dates that can't be read as dates."""
+    _sync_schema(conn)
+
+
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5, _migrate_v6, _migrate_v7, _migrate_v8, _migrate_v9, _migrate_v10, _migrate_v11, _migrate_v12, _migrate_v13, _migrate_v14, _migrate_v15, _migrate_v16]
+
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def init_db_migration():
+    """Brings the database schema up to date, one transaction per migration.
+
+    The schema version is kept in ``PRAGMA user_version`` and re-read inside
+    each migration's write transaction, so concurrent processes never apply
+    the same step twice. A database file is checked once per process; later
+    calls (every Streamlit rerun) return without touching it.
+    """
+    path = os.path.abspath(DB_NAME)
+    with _migrated_lock:
+        if path in _migrated:
+            return
+        imported = []
+        with connect() as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, migration in enumerate(MIGRATIONS, start=1):
+            if version <= current:
+                continue
+            with transaction() as conn:
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                    continue
+                imported += migration(conn) or []
+                conn.execute(f"PRAGMA user_version = {version}")
+        for csv_file in imported:
+            os.rename(csv_file, f"{csv_file}.backup")
+        _migrated.add(path)
+
+
+# --- 4. SHARED CACHE ---
+# Snapshots are shared by every session in the process, so callers must treat
+# returned DataFrames as read-only. Entries are keyed by the versions of the
+# tables they were built from and are rebuilt once any of those versions moves.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def table_versions():
+    """Returns {table_name: version} for every versioned table."""
+    with connect() as conn:
+        return dict(conn.execute("SELECT table_name, version FROM table_versions"))
+
+
+def cached(key, tables, loader):
+    """Returns ``loader()``, memoized under ``key`` until one of ``tables`` changes."""
+    current = table_versions()
+    versions = tuple(current.get(t, 0) for t in tables)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] == versions:
+            _cache.move_to_end(key)
+            return hit[1]
+    value = loader()
+    with _cache_lock:
+        _cache[key] = (versions, value)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def snapshot(table_name, where=None):
+    """Cached, shared version of :func:`load_table`."""
+    key = ("table", table_name, tuple(sorted((where or {}).items())))
+    return cached(key, [table_name], lambda: load_table(table_name, where))
+
+
+# --- 5. ROW OPERATIONS ---
+def load_table(table_name, where=None):
+    """Returns the table as a DataFrame indexed by row id, optionally filtered by equality."""
+    sql, params = select_sql(table_name), []
+    if where:
+        sql += " WHERE " + " AND ".join(f"{_q(c)} = ?" for c in _sql_columns(table_name, where))
+        params = list(where.values())
+    with connect() as conn:
+        return pd.read_sql_query(sql + " ORDER BY id", conn, params=params, index_col="id")
+
+
+def desk_items(assignee):
+    """Returns the assignee's open tasks and subtasks as one frame for My Desk.
+
+    Columns are plain identifiers so rows can be rendered as named tuples.
+    ``Acknowledged`` is True once the assignee has any activity on the row.
+    """
+    def load():
+        parts = []
+        for table_name, kind, name_col in (("tasks", "Main", "task_name"), ("subtasks", "Sub", "subtask_name")):
+            parts.append(f"""
+                SELECT {_literal(kind)} AS Type, t.id AS Idx, t.project AS Project, t.{name_col} AS Name,
+                       t.status AS Status, t.due_date AS Due, t.comments AS Comments, t.attachments AS Attachments,
+                       t.row_version AS Version,
+                       EXISTS (SELECT 1 FROM task_events e WHERE e.actor = t.assignee AND e.task_table = {_literal(table_name)} AND e.task_id = t.id) AS Acknowledged
+                FROM {table_name} t WHERE t.assignee = :assignee AND t.status <> 'Completed'
+            """)
+        with connect() as conn:
+            items = pd.read_sql_query(" UNION ALL ".join(parts) + " ORDER BY Type, Idx", conn, params={"assignee": assignee})
+        items["Acknowledged"] = items["Acknowledged"].astype(bool)
+        return items
+    return cached(("desk", assignee), ["tasks", "subtasks", "task_events"], load)
+
+
+def board_page(project, status, page=0, page_size=BOARD_PAGE_SIZE, sort="Due date", assignee=None, text=None):
+    """Returns one page of a project's main tasks in one status column, plus the column's total.
+
+    ``assignee`` and ``text`` (a case-insensitive substring of the task name)
+    narrow the column; ``sort`` is a key of BOARD_SORTS. Filtering, ordering
+    and paging all happen in SQL. Each row carries its subtask count, so the
+    subtasks themselves can wait for :func:`subtasks_of`.
+    """
+    conds, params = ["project = :project", "status = :status"], {"project": project, "status": status}
+    if assignee:
+        conds.append("assignee = :assignee")
+        params["assignee"] = assignee
+    if text:
+        conds.append("instr(lower(task_name), lower(:text)) > 0")
+        params["text"] = text
+    where = " AND ".join(conds)
+
+    def load():
+        with connect() as conn:
+            total = conn.execute(f"SELECT count(*) FROM tasks WHERE {where}", params).fetchone()[0]
+            cards = pd.read_sql_query(f"""
+                SELECT t.id AS Idx, t.task_name AS Name, t.assignee AS Assignee, t.status AS Status, t.due_date AS Due,
+                       t.comments AS Comments, (SELECT count(*) FROM subtasks s WHERE s.parent_task_id = t.id) AS Subtasks
+                FROM tasks t WHERE {where} ORDER BY {BOARD_SORTS[sort]} LIMIT :limit OFFSET :offset
+            """, conn, params={**params, "limit": page_size, "offset": page * page_size})
+        return cards, total
+    key = ("board", project, status, page, page_size, sort, assignee, text)
+    return cached(key, ["tasks", "subtasks"], load)
+
+
+def subtasks_of(task_id):
+    """Returns the subtasks of one main task, in the order they were added."""
+    def load():
+        with connect() as conn:
+            return pd.read_sql_query("""
+                SELECT subtask_name AS "Subtask Name", assignee AS Assignee, status AS Status, due_date AS "Due Date"
+                FROM subtasks WHERE parent_task_id = ? ORDER BY id
+            """, conn, params=[int(task_id)])
+    return cached(("subtasks_of", int(task_id)), ["subtasks"], load)
+
+
+def timeline():
+    """Returns every task and subtask with Start/End timestamps for the calendar.
+
+    Built with column operations over one UNION query and shared until tasks
+    or subtasks change. Rows without a usable start date are dropped, and a
+    missing or same-day due date becomes a one-day bar.
+    """
+    def load():
+        sql = """
+            SELECT project AS Project, '[Main] ' || task_name AS "Task Display", assignee AS Assignee, status AS Status,
+                   due_date AS "Due Date", added_day, due_day FROM tasks
+            UNION ALL
+            SELECT project, '[Sub] ' || subtask_name, assignee, status, due_date, added_day, due_day FROM subtasks
+        """
+        with connect() as conn:
+            cal = pd.read_sql_query(sql, conn)
+        start = pd.to_datetime(cal.pop("added_day"), unit="D")
+        end = pd.to_datetime(cal.pop("due_day"), unit="D")
+        cal["Start"] = start
+        cal["End"] = end.mask(end.isna() | (end == start), start + pd.Timedelta(days=1))
+        return cal.dropna(subset=["Start", "End"]).sort_values("End", ignore_index=True)
+    return cached(("timeline",), ["tasks", "subtasks"], load)
+
+
+def open_deadlines(min_day=None, max_day=None, projects=None):
+    """Returns open tasks and subtasks due between two epoch days (inclusive).
+
+    Either bound may be None. The range is answered from the due_day indexes,
+    so rows without a due date never match.
+    """
+    conds, params = ["status <> 'Completed'", "due_day IS NOT NULL"], {}
+    if min_day is not None:
+        conds.append("due_day >= :lo")
+        params["lo"] = int(min_day)
+    if max_day is not None:
+        conds.append("due_day <= :hi")
+        params["hi"] = int(max_day)
+    if projects:
+        names = [f":p{i}" for i in range(len(projects))]
+        conds.append(f"project IN ({', '.join(names)})")
+        params.update({n[1:]: p for n, p in zip(names, projects)})
+    where = " AND ".join(conds)
+
+    def load():
+        sql = f"""
+            SELECT 'Main' AS Type, id AS Idx, project AS Project, task_name AS "Task Display", assignee AS Assignee,
+                   status AS Status, due_date AS "Due Date", due_day AS "Due Day" FROM tasks WHERE {where}
+            UNION ALL
+            SELECT 'Sub', id, project, subtask_name, assignee, status, due_date, due_day FROM subtasks WHERE {where}
+            ORDER BY "Due Day"
+        """
+        with connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+    return cached(("deadlines", min_day, max_day, tuple(projects or ())), ["tasks", "subtasks"], load)
+
+
+def deadline_digest(day, horizon_days, per_user):
+    """Returns the open deadlines each active user should hear about on epoch ``day``.
+
+    Rows are tagged Section "Overdue" (due before ``day``) or "Upcoming" (due
+    within ``horizon_days`` from ``day``), and ordered by Recipient, Section
+    and due day. At most ``per_user`` rows per user and section are returned;
+    "Total" carries the full count so a digest can say how many were left out.
+    Both ranges are read from the due_day indexes.
+    """
+    parts = " UNION ALL ".join(f"""
+        SELECT '{kind}' AS kind, project, {name} AS name, assignee, due_date, due_day FROM {table_name}
+        WHERE status <> 'Completed' AND due_day < :hi
+    """ for table_name, kind, name in (("tasks", "Main", "task_name"), ("subtasks", "Sub", "subtask_name")))
+    sql = f"""
+        WITH due AS (
+            SELECT *, CASE WHEN due_day < :day THEN 'Overdue' ELSE 'Upcoming' END AS section FROM ({parts})
+        ), ranked AS (
+            SELECT *, row_number() OVER (PARTITION BY assignee, section ORDER BY due_day, name) AS pos,
+                   count(*) OVER (PARTITION BY assignee, section) AS total
+            FROM due WHERE assignee IN (SELECT full_name FROM users WHERE status = 'Active')
+        )
+        SELECT assignee AS Recipient, section AS Section, kind AS Type, project AS Project, name AS "Task Display",
+               due_date AS "Due Date", due_day AS "Due Day", total AS Total
+        FROM ranked WHERE pos <= :per_user ORDER BY assignee, section, due_day, name
+    """
+    params = {"day": int(day), "hi": int(day) + int(horizon_days) + 1, "per_user": int(per_user)}
+    with connect() as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def send_digests(day, digests, sender):
+    """Mails each ``{recipient: (subject, message)}`` digest unless one was already sent for epoch ``day``.
+
+    The check, the mail rows and the log rows share one transaction, so
+    concurrent or repeated runs send each user at most one digest a day.
+    Returns the number of digests sent.
+    """
+    stamp = now_stamp()
+    with transaction() as conn:
+        done = {r for (r,) in conn.execute("SELECT recipient FROM digest_log WHERE digest_day = ?", (int(day),))}
+        sent = 0
+        for recipient, (subject, message) in digests.items():
+            if recipient in done:
+                continue
+            mail_id = conn.execute(
+                "INSERT INTO mail (timestamp, sender, recipient, subject, message, read, thread_key) VALUES (?, ?, ?, ?, ?, 'No', ?)",
+                (stamp, sender, recipient, subject, message, thread_key(subject)),
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO digest_log (recipient, digest_day, mail_id, created_at) VALUES (?, ?, ?, ?)",
+                (recipient, int(day), mail_id, stamp),
+            )
+            sent += 1
+    return sent
+
+
+def project_names():
+    """Returns the distinct task projects, in the order they first appeared."""
+    def load():
+        with connect() as conn:
+            return [row[0] for row in conn.execute("SELECT project FROM tasks GROUP BY project ORDER BY min(id)")]
+    return cached(("projects",), ["tasks"], load)
+
+
+def rollup_counts(project=None):
+    """Returns precomputed task counts by (Kind, Project, Assignee, Status), optionally for one project."""
+    def load():
+        where = "WHERE project = :project" if project is not None else ""
+        sql = f"SELECT kind AS Kind, project AS Project, assignee AS Assignee, status AS Status, count AS Count FROM task_rollup {where}"
+        with connect() as conn:
+            return pd.read_sql_query(sql, conn, params={"project": project})
+    return cached(("rollup", project), ["tasks", "subtasks"], load)
+
+
+def unread_mail(recipient):
+    """Returns the number of unread messages addressed to ``recipient``."""
+    with connect() as conn:
+        row = conn.execute("SELECT unread FROM mail_unread WHERE recipient = ?", (recipient,)).fetchone()
+    return row[0] if row else 0
+
+
+def insert_row(table_name, values):
+    """Inserts one row keyed by display column names and returns its new id."""
+    values = _with_derived(table_name, values)
+    cols = _sql_columns(table_name, values)
+    marks = ", ".join("?" for _ in cols)
+    with transaction() as conn:
+        cur = conn.execute(f"INSERT INTO {_q(table_name)} ({', '.join(map(_q, cols))}) VALUES ({marks})", list(values.values()))
+        return cur.lastrowid
+
+
+def _task_key(project, name):
+    """Duplicate-check key for a task: project and name, trimmed and lowercased in Python (SQLite's lower() is ASCII-only)."""
+    return str(project or "").strip().lower(), str(name or "").strip().lower()
+
+
+def _existing_task_keys(conn):
+    return {_task_key(project, name) for project, name in conn.execute("SELECT project, task_name FROM tasks")}
+
+
+def insert_tasks(records, defaults=None):
+    """Bulk-inserts task records in one transaction and returns (inserted, skipped).
+
+    Each record is merged over ``defaults`` (both keyed by display column).
+    Records without a Project or Task Name are skipped, as are records whose
+    name already exists in the same project, in the table or earlier in the
+    batch (see :func:`_task_key`).
+    """
+    rows = []
+    for record in records:
+        row = _with_derived("tasks", {**(defaults or {}), **record})
+        row["Project"], row["Task Name"] = str(row.get("Project") or "").strip(), str(row.get("Task Name") or "").strip()
+        if row["Project"] and row["Task Name"]:
+            rows.append(row)
+    if not rows:
+        return 0, len(records)
+    cols = sorted({c for row in rows for c in row})
+    sql_cols = _sql_columns("tasks", cols)
+    fallback = {display: default for display, _, _, default in SCHEMAS["tasks"]}
+    with transaction() as conn:
+        seen = _existing_task_keys(conn)
+        fresh = []
+        for row in rows:
+            key = _task_key(row["Project"], row["Task Name"])
+            if key not in seen:
+                seen.add(key)
+                fresh.append(tuple(row.get(c, fallback[c]) for c in cols))
+        conn.executemany(
+            f"INSERT INTO tasks ({', '.join(map(_q, sql_cols))}) VALUES ({', '.join('?' for _ in cols)})", fresh,
+        )
+    return len(fresh), len(records) - len(fresh)
+
+
+def update_row(table_name, row_id, values, expected_version=None, event=None):
+    """Updates the given columns of one row.
+
+    Tables with a ``Row Version`` column get it incremented on every update.
+    Passing ``expected_version`` turns the write into a compare-and-swap that
+    only applies if nobody else has saved the row since that version was read.
+    An ``event`` of ``(actor, action, note)`` is appended to the row's activity
+    log in the same transaction when the update applies.
+    Returns False if the row does not exist or the version no longer matches.
+    """
+    values = _with_derived(table_name, values)
+    cols = _sql_columns(table_name, values)
+    assignments = [f"{_q(c)} = ?" for c in cols]
+    versioned = any(sql == "row_version" for _, sql, _, _ in SCHEMAS[table_name])
+    if versioned:
+        assignments.append("row_version = row_version + 1")
+    sql, params = f"UPDATE {_q(table_name)} SET {', '.join(assignments)} WHERE id = ?", [*values.values(), int(row_id)]
+    if expected_version is not None:
+        if not versioned:
+            raise ValueError(f"Table '{table_name}' has no row version")
+        sql += " AND row_version = ?"
+        params.append(int(expected_version))
+    with transaction() as conn:
+        if conn.execute(sql, params).rowcount != 1:
+            return False
+        if event is not None:
+            _append_event(conn, table_name, row_id, *event)
+        return True
+
+
+def _append_event(conn, table_name, task_id, actor, action, note):
+    conn.execute(
+        "INSERT INTO task_events (task_table, task_id, actor, action, note, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (table_name, int(task_id), actor, action, note, now_stamp()),
+    )
+
+
+def task_history(table_name, task_id, page=0, page_size=EVENTS_PAGE_SIZE):
+    """Returns one page of a task's activity, newest first, and the total number of events."""
+    with connect() as conn:
+        total = conn.execute("SELECT count(*) FROM task_events WHERE task_table = ? AND task_id = ?", (table_name, int(task_id))).fetchone()[0]
+        page_df = pd.read_sql_query(
+            select_sql("task_events") + " WHERE task_table = ? AND task_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+            conn, params=[table_name, int(task_id), page_size, page * page_size], index_col="id",
+        )
+    return page_df, total
+
+
+def chat_after(after_id=0, limit=CHAT_PAGE_SIZE):
+    """Returns up to ``limit`` chat messages with ids above ``after_id``, oldest first."""
+    with connect() as conn:
+        return pd.read_sql_query(select_sql("chat") + " WHERE id > ? ORDER BY id LIMIT ?", conn, params=[int(after_id), limit], index_col="id")
+
+
+def chat_before(before_id=None, limit=CHAT_PAGE_SIZE):
+    """Returns the ``limit`` chat messages just below ``before_id`` (the latest if None), oldest first."""
+    sql, params = select_sql("chat"), [limit]
+    if before_id is not None:
+        sql, params = sql + " WHERE id < ?", [int(before_id), limit]
+    with connect() as conn:
+        return pd.read_sql_query(sql + " ORDER BY id DESC LIMIT ?", conn, params=params, index_col="id").iloc[::-1]
+
+
+def watermark(source):
+    """Returns the id of the last row of ``source`` an AI mining run has analyzed (0 if none)."""
+    with connect() as conn:
+        row = conn.execute("SELECT last_id FROM ai_watermarks WHERE source = ?", (source,)).fetchone()
+    return row[0] if row else 0
+
+
+def record_mining(source, items, last_id):
+    """Stores a mining run's suggestions as pending and advances the watermark of ``source`` to ``last_id``.
+
+    Returns the items that are new: not already a task in the same project,
+    not suggested by an earlier run, and not repeated within ``items``
+    (see :func:`_task_key`). Runs in one transaction. The
+    suggestions wait in the table for :func:`resolve_suggestions`, so they
+    outlive the session that ran the mining.
+    """
+    stamp = now_stamp()
+    with transaction() as conn:
+        seen = _existing_task_keys(conn)
+        seen.update(_task_key(project, name) for project, name in conn.execute("SELECT project, task_name FROM ai_suggestions"))
+        fresh = []
+        for it in items:
+            key = _task_key(it["Project"], it["Task Name"])
+            if key not in seen:
+                seen.add(key)
+                fresh.append(it)
+        conn.executemany(
+            "INSERT INTO ai_suggestions (source, project, task_name, assignee, task_key, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(source, it["Project"], it["Task Name"], it["Assignee"], _task_key(it["Project"], it["Task Name"])[1], stamp) for it in fresh],
+        )
+        updated = conn.execute(
+            "UPDATE ai_watermarks SET last_id = max(last_id, ?), updated_at = ? WHERE source = ?", (int(last_id), stamp, source),
+        ).rowcount
+        if not updated:
+            conn.execute("INSERT INTO ai_watermarks (source, last_id, updated_at) VALUES (?, ?, ?)", (source, int(last_id), stamp))
+    return fresh
+
+
+def resolve_suggestions(approved=(), dismissed=()):
+    """Marks pending AI suggestions, by id, as approved or dismissed. Suggestions already resolved are left alone."""
+    with transaction() as conn:
+        for status, ids in (("Approved", approved), ("Dismissed", dismissed)):
+            conn.executemany("UPDATE ai_suggestions SET status = ? WHERE id = ? AND status = 'Pending'", [(status, int(i)) for i in ids])
+
+
+def mail_page(recipient, before_id=None, unread_only=False, limit=MAIL_PAGE_SIZE):
+    """Returns up to ``limit`` messages to ``recipient`` with ids below ``before_id``, newest first.
+
+    Pages are keyed by the last id shown rather than an offset, so every page
+    is a short range read on the inbox indexes however large the mailbox is.
+    """
+    sql, params = select_sql("mail") + " WHERE recipient = ?", [recipient]
+    if unread_only:
+        sql += " AND read = 'No'"
+    if before_id is not None:
+        sql += " AND id < ?"
+        params.append(int(before_id))
+    with connect() as conn:
+        return pd.read_sql_query(sql + " ORDER BY id DESC LIMIT ?", conn, params=params + [limit], index_col="id")
+
+
+def mail_thread(user, key):
+    """Returns every message in thread ``key`` sent to or by ``user``, oldest first."""
+    with connect() as conn:
+        return pd.read_sql_query(
+            select_sql("mail") + " WHERE thread_key = ? AND (recipient = ? OR sender = ?) ORDER BY id",
+            conn, params=[key, user, user], index_col="id",
+        )
+
+
+def mark_mail_read(recipient, ids=None):
+    """Marks ``recipient``'s unread mail as read in one UPDATE, all of it or just ``ids``. Returns the number changed."""
+    sql, params = "UPDATE mail SET read = 'Yes' WHERE recipient = ? AND read = 'No'", [recipient]
+    if ids is not None:
+        ids = [int(i) for i in ids]
+        if not ids:
+            return 0
+        sql += f" AND id IN ({', '.join('?' for _ in ids)})"
+        params += ids
+    with transaction() as conn:
+        return conn.execute(sql, params).rowcount
+
+
+def _match_query(text):
+    """Turns free text into an FTS5 query: every word must match, as a prefix."""
+    words = [w.replace('"', '""') for w in str(text).split()]
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search(user, text, page=0, page_size=SEARCH_PAGE_SIZE):
+    """Returns one page of search hits for ``text``, best first, and the total number of hits.
+
+    Hits have Source, Ref (the row id), Title, Snippet and Project columns;
+    mail only matches messages ``user`` sent or received. Ranking uses FTS5's
+    bm25; without FTS5 the search falls back to LIKE, newest first.
+    """
+    words = str(text).split()
+    if not words:
+        return pd.DataFrame(columns=["Source", "Ref", "Title", "Snippet", "Project"]), 0
+    mail_code = SEARCH_SOURCES["mail"][0]
+    with connect() as conn:
+        if _table_columns(conn, "search_index"):
+            where = f"""
+                search_index MATCH :q AND (source <> 'mail' OR rowid IN (
+                    SELECT id * 8 + {mail_code} FROM mail WHERE recipient = :user
+                    UNION ALL SELECT id * 8 + {mail_code} FROM mail WHERE sender = :user))
+            """
+            params = {"q": _match_query(text), "user": user, "limit": page_size, "offset": page * page_size}
+            total = conn.execute(f"SELECT count(*) FROM search_index WHERE {where}", params).fetchone()[0]
+            hits = pd.read_sql_query(f"""
+                SELECT source AS Source, rowid >> 3 AS Ref, title AS Title,
+                       snippet(search_index, -1, '**', '**', '…', 12) AS Snippet, project AS Project
+                FROM search_index WHERE {where} ORDER BY bm25(search_index, 5.0, 1.0) LIMIT :limit OFFSET :offset
+            """, conn, params=params)
+            return hits, total
+        parts, params = [], {"user": user}
+        for i, word in enumerate(words):
+            params[f"w{i}"] = f"%{word}%"
+        for table_name, (_, title, body, project, _) in SEARCH_SOURCES.items():
+            title, body, project = (e.format(r="r") for e in (title, body, project))
+            conds = [f"({title} LIKE :w{i} OR {body} LIKE :w{i})" for i in range(len(words))]
+            if table_name == "mail":
+                conds.append("(r.recipient = :user OR r.sender = :user)")
+            parts.append(f"""
+                SELECT {_literal(table_name)} AS Source, r.id AS Ref, {title} AS Title, substr({body}, 1, 120) AS Snippet, {project} AS Project
+                FROM {_q(table_name)} r WHERE {" AND ".join(conds)}
+            """)
+        union = " UNION ALL ".join(parts)
+        total = conn.execute(f"SELECT count(*) FROM ({union})", params).fetchone()[0]
+        hits = pd.read_sql_query(f"SELECT * FROM ({union}) ORDER BY Ref DESC LIMIT :limit OFFSET :offset",
+                                 conn, params={**params, "limit": page_size, "offset": page * page_size})
+    return hits, total
+
+
+def delete_row(table_name, row_id):
+    """Deletes one row by id. Returns False if the row does not exist."""
+    with transaction() as conn:
+        cur = conn.execute(f"DELETE FROM {_q(table_name)} WHERE id = ?", (int(row_id),))
+        return cur.rowcount == 1
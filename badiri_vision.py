@@ -0,0 +1,123 @@
+"""Image preparation for the AI minutes extractor.
+
+Uploads are identified by their magic bytes rather than their extension.
+Photos are turned upright, laid over white if they have transparency,
+downscaled, converted to grayscale when they are essentially documents, and recompressed as JPEG before they are sent. PDFs
+are split into one prepared image per page.
+"""
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+# Optional: Pillow for resizing/recompression, pypdfium2 for PDF pages. Imported on first use.
+HAS_PIL = find_spec("PIL") is not None
+HAS_PDF = find_spec("pypdfium2") is not None
+
+MAX_SIDE = 1600 # Longest side, in pixels, of an image sent to the model
+JPEG_QUALITY = 80
+GRAY_SATURATION = 40 # Mean HSV saturation (0-255) below which a page is treated as a black & white document
+PDF_SCALE = 2 # Render scale for PDF pages (1 = 72 dpi)
+MAX_PDF_PAGES = 20
+PREP_WORKERS = 4
+
+# pdfium is not thread-safe, even across documents, and Streamlit runs each
+# session's script in its own thread, so every pdfium call holds this lock.
+_pdfium_lock = threading.Lock()
+
+MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+]
+
+
+class UnsupportedUpload(Exception):
+    """Raised when an upload is not an image or PDF this module can prepare."""
+
+
+def sniff_mime(data):
+    """Returns the MIME type implied by the first bytes of ``data``, or None."""
+    for magic, mime in MAGIC:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _is_document(img):
+    """True when an image has so little colour that grayscale loses nothing."""
+    sample = img.convert("RGB")
+    sample.thumbnail((64, 64))
+    saturation = sample.convert("HSV").getchannel("S")
+    pixels = list(saturation.getdata())
+    return sum(pixels) / len(pixels) < GRAY_SATURATION
+
+
+def _flatten(img):
+    """Lays an image with transparency over white, so clear backgrounds don't turn black in JPEG."""
+    from PIL import Image
+    if img.mode not in ("RGBA", "LA", "PA") and "transparency" not in img.info:
+        return img
+    rgba = img.convert("RGBA")
+    flat = Image.new("RGB", rgba.size, "white")
+    flat.paste(rgba, mask=rgba.getchannel("A"))
+    return flat
+
+
+def prepare_image(img):
+    """Uprights, flattens, grays (if it looks like a document), downscales and JPEG-encodes a PIL image."""
+    from PIL import ImageOps
+    img = _flatten(ImageOps.exif_transpose(img))
+    img = img.convert("L") if _is_document(img) else img.convert("RGB")
+    img.thumbnail((MAX_SIDE, MAX_SIDE))
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def _prepare_bytes(data, mime):
+    if not HAS_PIL:
+        return data, mime
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            prepared = prepare_image(img)
+    except (OSError, ValueError):
+        raise UnsupportedUpload("The image could not be read.") from None
+    # A small JPEG can come out larger after re-encoding; keep whichever is smaller
+    return (prepared, "image/jpeg") if len(prepared) < len(data) or mime != "image/jpeg" else (data, mime)
+
+
+def _pdf_images(data):
+    """Renders up to MAX_PDF_PAGES pages and returns ``(PIL images, total page count)``."""
+    import pypdfium2 as pdfium
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            total = len(pdf)
+            return [pdf[i].render(scale=PDF_SCALE).to_pil() for i in range(min(total, MAX_PDF_PAGES))], total
+        finally:
+            pdf.close()
+
+
+def prepare_upload(data):
+    """Returns ``(images, skipped pages)``: the ``(bytes, mime)`` images ready to send, one per page.
+
+    Images give a single entry. PDF pages are rendered one after another
+    under the pdfium lock and then prepared concurrently; pages past
+    MAX_PDF_PAGES are not sent and are counted in ``skipped pages``.
+    """
+    mime = sniff_mime(data)
+    if mime is None:
+        raise UnsupportedUpload("Upload a JPG, PNG, WEBP, GIF or PDF file.")
+    if mime != "application/pdf":
+        return [_prepare_bytes(data, mime)], 0
+    if not HAS_PDF or not HAS_PIL:
+        raise UnsupportedUpload("PDF minutes need the optional pypdfium2 and Pillow packages.")
+    pages, total = _pdf_images(data)
+    with ThreadPoolExecutor(max_workers=PREP_WORKERS) as pool:
+        return [(jpeg, "image/jpeg") for jpeg in pool.map(prepare_image, pages)], total - len(pages)
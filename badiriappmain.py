@@ -1,119 +1,203 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+from functools import partial
+from importlib.util import find_spec
 import os
-import io
-import requests
-import base64
-import json
-import sqlite3
-
-# Try to load the PowerPoint library securely
-try:
-    from pptx import Presentation
-    from pptx.util import Inches, Pt
-    HAS_PPTX = True
-except ImportError:
-    HAS_PPTX = False
-
-# Try to load Plotly for the Calendar Timeline & Analytics
-try:
-    import plotly.express as px
-    HAS_PLOTLY = True
-except ImportError:
-    HAS_PLOTLY = False
+
+import badiri_store as store
+import badiri_reports as reports
+import badiri_exports as exports
+import badiri_attachments as attachments
+import badiri_scheduler as scheduler
+
+HAS_PPTX = reports.HAS_PPTX
+
+# Plotly draws the Calendar Timeline & Analytics; it is imported by the tab that needs it
+HAS_PLOTLY = find_spec("plotly") is not None
 
 # --- 1. APP CONFIGURATION ---
 st.set_page_config(page_title="Marumo Technologies - Badiri App", layout="wide")
 
-DB_NAME = "badiri_backend.db"
-os.makedirs("attachments", exist_ok=True) # Ensure attachment folder exists
-
-# --- 2. POWERPOINT GENERATOR ---
-def create_ppt(df, sub_df):
-    prs = Presentation()
-    title_slide = prs.slides.add_slide(prs.slide_layouts[0])
-    title_slide.shapes.title.text = "Badiri App Status Report"
-    title_slide.placeholders[1].text = f"Marumo Technologies\nGenerated on {datetime.now().strftime('%Y-%m-%d')}"
-    
-    metrics_slide = prs.slides.add_slide(prs.slide_layouts[1])
-    metrics_slide.shapes.title.text = "Executive Summary"
-    tf = metrics_slide.shapes.placeholders[1].text_frame
-    total = len(df)
-    completed = len(df[df["Status"] == "Completed"])
-    pending = len(df[df["Status"] == "Pending"])
-    tf.text = f"Total Main Tasks: {total}"
-    p1 = tf.add_paragraph()
-    p1.text = f"✅ Completed Tasks: {completed}"
-    p2 = tf.add_paragraph()
-    p2.text = f"⏳ Pending Tasks: {pending}"
-    
-    ppt_stream = io.BytesIO()
-    prs.save(ppt_stream)
-    ppt_stream.seek(0)
-    return ppt_stream
-
-# --- 3. DATABASE ENGINE ---
-def init_db_migration():
-    conn = sqlite3.connect(DB_NAME)
-    
-    csv_mapping = {
-        "tasks": "badiri_db.csv",
-        "subtasks": "badiri_subtasks.csv",
-        "users": "badiri_users.csv",
-        "chat": "badiri_chat.csv",
-        "mail": "badiri_mail.csv"
-    }
-    
-    for table_name, csv_file in csv_mapping.items():
-        if os.path.exists(csv_file):
-            try:
-                check = pd.read_sql(f"SELECT count(*) FROM {table_name}", conn)
-                if check.iloc[0,0] > 0: continue 
-            except: pass 
-            
-            df = pd.read_csv(csv_file)
-            df.to_sql(table_name, conn, if_exists="replace", index=False)
-            os.rename(csv_file, f"{csv_file}.backup")
-    conn.close()
-
-init_db_migration()
-
-def load_data(table_name, default_columns):
-    conn = sqlite3.connect(DB_NAME)
-    try:
-        df = pd.read_sql(f"SELECT * FROM {table_name}", conn)
-    except:
-        df = pd.DataFrame(columns=default_columns)
-        df.to_sql(table_name, conn, if_exists="replace", index=False)
-    conn.close()
+os.makedirs(attachments.ATTACH_DIR, exist_ok=True) # Ensure attachment folder exists
+DESK_PAGE_SIZE = 10 # My Desk tasks rendered per page
+CHAT_POLL_SECONDS = 3 # How often the open chat feed checks for new messages
+CHAT_KEEP_ROWS = 5 * store.CHAT_PAGE_SIZE # Most messages an open chat feed holds at once
+SEARCH_LABELS = {"tasks": "📌 Task", "subtasks": "🔗 Subtask", "task_events": "📝 Activity", "chat": "💬 Chat", "mail": "✉️ Mail"}
+
+# --- 2. POWERPOINT EXPORT ---
+@st.fragment(run_every=1.5)
+def deck_progress(project):
+    # Polls the background deck build and reruns the page once it has finished.
+    deck = reports.deck_future(project)
+    if deck is None or deck.done():
+        st.rerun()
+    st.info("⏳ Building the PowerPoint deck in the background...")
+
+def deck_export(project):
+    deck = reports.deck_future(project)
+    if deck is None:
+        if st.button("📊 Prepare PowerPoint"):
+            reports.request_deck(project)
+            st.rerun()
+    elif not deck.done():
+        deck_progress(project)
+    elif deck.exception() is not None:
+        st.error(f"❌ PowerPoint generation failed: {deck.exception()}")
+        if st.button("🔁 Retry PowerPoint"):
+            reports.request_deck(project)
+            st.rerun()
+    else:
+        st.download_button("📊 Download PowerPoint", data=deck.result(), file_name=f"Report_{datetime.now().strftime('%Y%m%d')}.pptx", on_click="ignore")
+
+# --- 3. CHAT FEED ---
+# The session holds one contiguous window of at most CHAT_KEEP_ROWS messages. While it follows the
+# conversation, new messages push the oldest out; once older pages are loaded it keeps those and drops
+# from the newest end instead, offering the newer messages again on demand.
+def chat_load_older():
+    log = st.session_state.chat_log
+    older = store.chat_before(log[0]["id"])
+    log[:0] = older.reset_index().to_dict("records")
+    st.session_state.chat_has_older = len(older) == store.CHAT_PAGE_SIZE
+    st.session_state.chat_browsing = True
+    if len(log) > CHAT_KEEP_ROWS:
+        del log[CHAT_KEEP_ROWS:]
+        st.session_state.chat_has_newer = True
+
+def chat_load_newer():
+    log = st.session_state.chat_log
+    newer = store.chat_after(log[-1]["id"])
+    log.extend(newer.reset_index().to_dict("records"))
+    if len(log) > CHAT_KEEP_ROWS:
+        del log[:-CHAT_KEEP_ROWS]
+        st.session_state.chat_has_older = True
+    if len(newer) < store.CHAT_PAGE_SIZE:
+        # Caught up: follow the conversation again
+        st.session_state.chat_has_newer = st.session_state.chat_browsing = False
+
+@st.fragment(run_every=CHAT_POLL_SECONDS)
+def chat_feed():
+    # Only asks the database for rows past the newest id shown, so a feed left open costs the same per refresh however long it runs.
+    if "chat_log" not in st.session_state:
+        latest = store.chat_before()
+        st.session_state.chat_log = latest.reset_index().to_dict("records")
+        st.session_state.chat_has_older = len(latest) == store.CHAT_PAGE_SIZE
+        st.session_state.chat_has_newer = st.session_state.chat_browsing = False
+    elif not st.session_state.chat_has_newer:
+        log = st.session_state.chat_log
+        while True:
+            fresh = store.chat_after(log[-1]["id"] if log else 0)
+            log.extend(fresh.reset_index().to_dict("records"))
+            if len(fresh) < store.CHAT_PAGE_SIZE or len(log) >= CHAT_KEEP_ROWS: break
+        more = len(fresh) == store.CHAT_PAGE_SIZE # Stopped at the cap with messages possibly still to come
+        if st.session_state.chat_browsing:
+            if more or len(log) > CHAT_KEEP_ROWS:
+                del log[CHAT_KEEP_ROWS:]
+                st.session_state.chat_has_newer = True
+        elif more:
+            # Far behind: jump straight to the newest messages instead of paging through the gap
+            st.session_state.chat_log = store.chat_before(limit=CHAT_KEEP_ROWS).reset_index().to_dict("records")
+            st.session_state.chat_has_older = True
+        elif len(log) > CHAT_KEEP_ROWS:
+            del log[:-CHAT_KEEP_ROWS]
+            st.session_state.chat_has_older = True
+    log = st.session_state.chat_log
     
-    for col in default_columns:
-        if col not in df.columns:
-            if col == "Status": df[col] = "Active" if table_name == "users" else "Pending"
-            elif col == "Role": df[col] = "Standard"
-            elif col == "Password": df[col] = "1234" 
-            elif col == "Read": df[col] = "No" 
-            else: df[col] = ""
-    return df
-
-def save_data(df, table_name):
-    conn = sqlite3.connect(DB_NAME)
-    df.to_sql(table_name, conn, if_exists="replace", index=False)
-    conn.close()
+    with st.container(height=400):
+        if st.session_state.chat_has_older:
+            st.button("⬆️ Load older messages", key="chat_older", on_click=chat_load_older)
+        if not log:
+            st.caption("No messages yet. Say hello!")
+        for msg in log:
+            is_me = (msg["User"] == st.session_state.current_user)
+            with st.chat_message("user" if is_me else "assistant"):
+                st.markdown(f"**{msg['User']}** <span style='font-size:0.8em; color:gray;'>({datetime.strptime(msg['Timestamp'], store.STAMP_FORMAT):%d %b %H:%M})</span>", unsafe_allow_html=True)
+                st.write(msg["Message"])
+        if st.session_state.chat_has_newer:
+            st.button("⬇️ Load newer messages", key="chat_newer", on_click=chat_load_newer)
+
+# --- 4. BACKGROUND AI REQUESTS ---
+@st.fragment(run_every=1)
+def ai_progress(job, label):
+    # Lists task records as they stream in and reruns the page once the request has finished.
+    stream = st.session_state.get(job)
+    if stream is None or stream.done:
+        st.rerun()
+    st.info(f"⏳ {label} ({len(stream.items)} task(s) so far)")
+    for it in list(stream.items):
+        st.caption(f"✅ {it['Project']} | {it['Task Name']} ({it['Assignee']})")
+
+def collect_ai_job(job, target, label):
+    # Moves a finished task stream into session_state[target] (None when the job stores its own results); shows the records arriving while it runs.
+    stream = st.session_state.get(job)
+    if stream is None:
+        return
+    if not stream.done:
+        ai_progress(job, label)
+        return
+    del st.session_state[job]
+    if target is not None:
+        st.session_state[target] = stream.items
+    if stream.error:
+        st.error(f"❌ {stream.error}")
+    if stream.skipped:
+        st.warning(f"⚠️ {stream.skipped} malformed item(s) in the AI response were skipped.")
+
+def approve_ai_tasks(items, selections, comment):
+    # Imports the ticked AI suggestions in one bulk insert and returns (added, skipped) counts.
+    today = datetime.now().strftime("%Y-%m-%d")
+    chosen = [it for it, sel in zip(items, selections) if sel]
+    return store.insert_tasks(chosen, defaults={"Status": "Pending", "Date Added": today, "Due Date": today, "Comments": comment, "Attachments": ""})
+
+def import_msg(added, skipped, source):
+    return f"✅ {added} task(s) imported from {source}!" + (f" {skipped} duplicate or incomplete item(s) skipped." if skipped else "")
+
+# --- 5. DATABASE ENGINE ---
+store.init_db_migration()
+scheduler.start() # Daily deadline digests; one background thread per process
 
 def show_inline_msg(location):
     if "inline_msg" in st.session_state and st.session_state.inline_msg.get("loc") == location:
-        st.success(st.session_state.inline_msg["msg"])
+        getattr(st, st.session_state.inline_msg.get("kind", "success"))(st.session_state.inline_msg["msg"])
         st.session_state.inline_msg = {} 
 
-if "task_db" not in st.session_state: st.session_state.task_db = load_data("tasks", ["Project", "Task Name", "Assignee", "Status", "Date Added", "Due Date", "Comments", "Attachments"])
-if "subtask_db" not in st.session_state: st.session_state.subtask_db = load_data("subtasks", ["Project", "Parent Task", "Subtask Name", "Assignee", "Status", "Date Added", "Due Date", "Comments", "Attachments"])
-if "user_db" not in st.session_state: st.session_state.user_db = load_data("users", ["Full Name", "Email", "Phone Number", "Status", "Role", "Password"])
-if "chat_db" not in st.session_state: st.session_state.chat_db = load_data("chat", ["Timestamp", "User", "Message"])
-if "mail_db" not in st.session_state: st.session_state.mail_db = load_data("mail", ["Timestamp", "From", "To", "Subject", "Message", "Read"])
+def paginate(total, key, page_size):
+    # Renders a page picker when the list spans several pages and returns the (start, stop) slice to show.
+    pages = max(1, -(-total // page_size))
+    if st.session_state.get(key, 1) > pages:
+        st.session_state[key] = pages
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=key) if pages > 1 else 1
+    return (page - 1) * page_size, page * page_size
+
+def seen_version(form_key, current):
+    # Returns the row version the form displayed on the previous run, so a submit is checked against what the user actually saw.
+    key = f"seen_version_{form_key}"
+    seen = st.session_state.get(key, current)
+    st.session_state[key] = current
+    return seen
+
+def show_activity(table_name, task_id, key):
+    page_key = f"activity_page_{key}"
+    page = st.session_state.get(page_key, 0)
+    events, total = store.task_history(table_name, task_id, page)
+    if total == 0:
+        return
+    st.markdown("**🕒 Activity (newest first):**")
+    for ev in events.to_dict("records"):
+        st.caption(f"[{ev['Created At']}] **{ev['Actor']}** {ev['Action']}: {ev['Note']}")
+    pages = -(-total // store.EVENTS_PAGE_SIZE)
+    if pages > 1:
+        c1, c2, c3 = st.columns([1, 1, 2])
+        c1.button("◀ Newer", key=f"{page_key}_newer", disabled=page == 0, on_click=lambda: st.session_state.update({page_key: page - 1}))
+        c2.button("Older ▶", key=f"{page_key}_older", disabled=page >= pages - 1, on_click=lambda: st.session_state.update({page_key: page + 1}))
+        c3.caption(f"Page {page + 1} of {pages}")
+
+def conflict_msg(location, name):
+    return {"loc": location, "kind": "warning", "msg": f"⚠️ '{name}' was changed by someone else while you were editing. Your update was not saved; please review the latest details and try again."}
+
+# Shared read-only snapshots; they refresh on the next rerun after any session writes.
+user_db = store.snapshot("users")
 if "ai_suggestions" not in st.session_state: st.session_state.ai_suggestions = []
-if "chat_ai_suggestions" not in st.session_state: st.session_state.chat_ai_suggestions = [] 
 if "plan_ai_suggestions" not in st.session_state: st.session_state.plan_ai_suggestions = [] 
 if "inline_msg" not in st.session_state: st.session_state.inline_msg = {}
 
@@ -123,10 +207,10 @@ if "logged_in" not in st.session_state:
     st.session_state.user_role = "Standard"
     st.session_state.is_admin = False
 
-active_users = st.session_state.user_db[st.session_state.user_db["Status"] == "Active"] if not st.session_state.user_db.empty else pd.DataFrame()
+active_users = user_db[user_db["Status"] == "Active"] if not user_db.empty else pd.DataFrame()
 user_list = active_users["Full Name"].tolist() if not active_users.empty else ["Unassigned"]
 
-# --- 4. MAIN APP ROUTING ---
+# --- 6. MAIN APP ROUTING ---
 if not st.session_state.logged_in:
     st.title("🔒 Login to Badiri App")
     st.markdown("Welcome to the Marumo Technologies workspace.")
@@ -142,15 +226,15 @@ if not st.session_state.logged_in:
                 st.session_state.inline_msg = {"loc": "top", "msg": "✅ Logged in successfully as Master Admin!"}
                 st.rerun()
             else:
-                safe_db = st.session_state.user_db.copy()
+                safe_db = user_db.copy()
                 safe_db["Email"] = safe_db["Email"].astype(str).str.strip().str.lower()
                 safe_db["Password"] = safe_db["Password"].astype(str).str.strip()
                 user_match = safe_db[(safe_db["Email"] == email_input.strip().lower()) & (safe_db["Password"] == pass_input.strip()) & (safe_db["Status"] == "Active")]
                 if not user_match.empty:
                     idx = user_match.index[0]
                     st.session_state.logged_in = True
-                    st.session_state.current_user = st.session_state.user_db.at[idx, "Full Name"]
-                    st.session_state.user_role = st.session_state.user_db.at[idx, "Role"]
+                    st.session_state.current_user = user_db.at[idx, "Full Name"]
+                    st.session_state.user_role = user_db.at[idx, "Role"]
                     st.session_state.is_admin = (st.session_state.user_role == "Admin")
                     st.session_state.inline_msg = {"loc": "top", "msg": f"✅ Welcome back, {st.session_state.current_user}!"}
                     st.rerun()
@@ -162,10 +246,12 @@ else:
         st.header("Badiri App")
         st.caption(f"User: {st.session_state.current_user}")
         
-        unread_count = len(st.session_state.mail_db[(st.session_state.mail_db["To"] == st.session_state.current_user) & (st.session_state.mail_db["Read"] == "No")])
+        unread_count = store.unread_mail(st.session_state.current_user)
         if unread_count > 0:
             st.error(f"📬 {unread_count} Unread Mail(s)")
             
+        st.text_input("🔎 Search", key="global_search", placeholder="Tasks, comments, chat, mail...", on_change=lambda: st.session_state.pop("search_page", None))
+            
         if st.button("🚪 Logout"):
             st.session_state.logged_in = False
             st.rerun()
@@ -179,15 +265,25 @@ else:
                 u_r = st.selectbox("Role", ["Standard", "Admin", "Viewer Only"])
                 u_p = st.text_input("Password", type="password")
                 if st.form_submit_button("Create User"):
-                    new_u = pd.DataFrame([{"Full Name": u_n, "Email": u_e, "Phone Number": "", "Status": "Active", "Role": u_r, "Password": u_p}])
-                    st.session_state.user_db = pd.concat([st.session_state.user_db, new_u], ignore_index=True)
-                    save_data(st.session_state.user_db, "users")
+                    store.insert_row("users", {"Full Name": u_n, "Email": u_e, "Phone Number": "", "Status": "Active", "Role": u_r, "Password": u_p})
                     st.session_state.inline_msg = {"loc": "sidebar_admin", "msg": f"✅ New user '{u_n}' created!"}
                     st.rerun()
 
     st.title("🛠️ Project Management Dashboard")
     show_inline_msg("top") 
     
+    # --- GLOBAL SEARCH RESULTS ---
+    search_text = st.session_state.get("global_search", "").strip()
+    if search_text:
+        with st.container(border=True):
+            hits, hits_total = store.search(st.session_state.current_user, search_text, page=st.session_state.get("search_page", 1) - 1)
+            st.markdown(f"#### 🔎 {hits_total} result(s) for \"{search_text}\"")
+            for hit in hits.itertuples(index=False):
+                where = f" · 📂 {hit.Project}" if hit.Project else ""
+                st.markdown(f"{SEARCH_LABELS.get(hit.Source, hit.Source)} **{hit.Title}**{where}  \n{hit.Snippet}")
+            paginate(hits_total, "search_page", store.SEARCH_PAGE_SIZE)
+            if st.button("✖ Clear Search", on_click=lambda: st.session_state.update(global_search="")): st.rerun()
+    
     # --- STICKY NAVIGATION MENU ---
     nav_options = ["🏠 My Desk"]
     if st.session_state.user_role != "Viewer Only": nav_options.append("📁 Project Workspace")
@@ -200,9 +296,6 @@ else:
     active_tab = st.radio("Main Menu", nav_options, horizontal=True, label_visibility="collapsed", key="main_nav")
     st.divider()
 
-    df = st.session_state.task_db
-    sub_df_all = st.session_state.subtask_db
-
     # ==========================================
     # --- TAB 1: MY DESK ---
     # ==========================================
@@ -210,23 +303,10 @@ else:
         st.subheader(f"👋 Welcome, {st.session_state.current_user}!")
         st.write("") 
         
-        my_main = df[(df["Assignee"] == st.session_state.current_user) & (df["Status"] != "Completed")]
-        my_sub = sub_df_all[(sub_df_all["Assignee"] == st.session_state.current_user) & (sub_df_all["Status"] != "Completed")]
-        
-        inbox_tasks = []
-        active_tasks = []
-        
-        for real_idx, row in my_main.iterrows():
-            is_unacknowledged = (row['Status'] == "Pending" and st.session_state.current_user not in str(row['Comments']))
-            t_data = {"Type": "Main", "Idx": real_idx, "Project": row["Project"], "Name": row["Task Name"], "Status": row["Status"], "Due": row["Due Date"], "Comments": str(row["Comments"]), "Attachments": str(row.get("Attachments", ""))}
-            if is_unacknowledged: inbox_tasks.append(t_data)
-            else: active_tasks.append(t_data)
-            
-        for real_idx, row in my_sub.iterrows():
-            is_unacknowledged = (row['Status'] == "Pending" and st.session_state.current_user not in str(row['Comments']))
-            t_data = {"Type": "Sub", "Idx": real_idx, "Project": row["Project"], "Name": row["Subtask Name"], "Status": row["Status"], "Due": row["Due Date"], "Comments": str(row["Comments"]), "Attachments": str(row.get("Attachments", ""))}
-            if is_unacknowledged: inbox_tasks.append(t_data)
-            else: active_tasks.append(t_data)
+        desk = store.desk_items(st.session_state.current_user)
+        inbox_mask = (desk["Status"] == "Pending") & ~desk["Acknowledged"]
+        inbox_tasks = desk[inbox_mask]
+        active_tasks = desk[~inbox_mask]
 
         # --- INBOX SECTION ---
         st.markdown("### ⚡ Inbox: Action Required")
@@ -236,46 +316,41 @@ else:
         if len(inbox_tasks) == 0:
             st.info("✅ Inbox Zero! You have no new tasks waiting.")
         else:
-            for t in inbox_tasks:
-                with st.expander(f"🔴 NEW: {t['Project']} - {t['Name']} (Due: {t['Due']})"):
-                    st.write(f"**Current Notes:** {t['Comments'] if pd.notna(t['Comments']) and t['Comments'].strip() and t['Comments'] != 'nan' else 'No notes provided.'}")
-                    with st.form(f"inbox_form_{t['Type']}_{t['Idx']}"):
+            start, stop = paginate(len(inbox_tasks), "desk_inbox_page", DESK_PAGE_SIZE)
+            for t in inbox_tasks.iloc[start:stop].itertuples(index=False, name="DeskItem"):
+                exp = st.expander(f"🔴 NEW: {t.Project} - {t.Name} (Due: {t.Due})", key=f"desk_exp_inbox_{t.Type}_{t.Idx}", on_change="rerun")
+                if not exp.open:
+                    continue
+                with exp:
+                    st.write(f"**Current Notes:** {t.Comments if pd.notna(t.Comments) and t.Comments.strip() and t.Comments != 'nan' else 'No notes provided.'}")
+                    show_activity("tasks" if t.Type == "Main" else "subtasks", t.Idx, f"inbox_{t.Type}_{t.Idx}")
+                    seen_ver = seen_version(f"inbox_form_{t.Type}_{t.Idx}", t.Version)
+                    with st.form(f"inbox_form_{t.Type}_{t.Idx}"):
                         action = st.radio("Action:", ["✅ Accept Task (Move to Workspace)", "↩️ Revert Task (Reassign)"], horizontal=True)
                         c1, c2 = st.columns(2)
                         revert_user = c1.selectbox("If reverting, send to:", user_list)
                         notes = c2.text_input("Add a comment / reason:")
                         
                         if st.form_submit_button("Confirm Action"):
-                            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-                            base_cmt = t['Comments'] if pd.notna(t['Comments']) and t['Comments'].strip() != "nan" else ""
-                            
                             if "Accept" in action:
                                 note_text = notes.strip() if notes.strip() else "Task formally accepted."
-                                new_cmt = base_cmt + f"\n[{timestamp}] {st.session_state.current_user} ACCEPTED: {note_text}"
-                                if t['Type'] == "Main":
-                                    st.session_state.task_db.at[t['Idx'], "Status"] = "In Progress"
-                                    st.session_state.task_db.at[t['Idx'], "Comments"] = new_cmt
-                                    save_data(st.session_state.task_db, "tasks")
+                                event = (st.session_state.current_user, "ACCEPTED", note_text)
+                                if t.Type == "Main":
+                                    saved = store.update_row("tasks", t.Idx, {"Status": "In Progress"}, expected_version=seen_ver, event=event)
                                 else:
-                                    st.session_state.subtask_db.at[t['Idx'], "Status"] = "In Progress"
-                                    st.session_state.subtask_db.at[t['Idx'], "Comments"] = new_cmt
-                                    save_data(st.session_state.subtask_db, "subtasks")
+                                    saved = store.update_row("subtasks", t.Idx, {"Status": "In Progress"}, expected_version=seen_ver, event=event)
                                 
-                                st.session_state.inline_msg = {"loc": "desk_inbox", "msg": f"✅ Task '{t['Name']}' Accepted and moved to your active workspace!"}
+                                st.session_state.inline_msg = {"loc": "desk_inbox", "msg": f"✅ Task '{t.Name}' Accepted and moved to your active workspace!"} if saved else conflict_msg("desk_inbox", t.Name)
                                 st.rerun()
                             else:
                                 note_text = notes.strip() if notes.strip() else "Task reverted."
-                                new_cmt = base_cmt + f"\n[{timestamp}] {st.session_state.current_user} REVERTED to {revert_user}: {note_text}"
-                                if t['Type'] == "Main":
-                                    st.session_state.task_db.at[t['Idx'], "Assignee"] = revert_user
-                                    st.session_state.task_db.at[t['Idx'], "Comments"] = new_cmt
-                                    save_data(st.session_state.task_db, "tasks")
+                                event = (st.session_state.current_user, "REVERTED", f"to {revert_user}: {note_text}")
+                                if t.Type == "Main":
+                                    saved = store.update_row("tasks", t.Idx, {"Assignee": revert_user}, expected_version=seen_ver, event=event)
                                 else:
-                                    st.session_state.subtask_db.at[t['Idx'], "Assignee"] = revert_user
-                                    st.session_state.subtask_db.at[t['Idx'], "Comments"] = new_cmt
-                                    save_data(st.session_state.subtask_db, "subtasks")
+                                    saved = store.update_row("subtasks", t.Idx, {"Assignee": revert_user}, expected_version=seen_ver, event=event)
                                     
-                                st.session_state.inline_msg = {"loc": "desk_inbox", "msg": f"✅ Task Reverted and reassigned to {revert_user}!"}
+                                st.session_state.inline_msg = {"loc": "desk_inbox", "msg": f"✅ Task Reverted and reassigned to {revert_user}!"} if saved else conflict_msg("desk_inbox", t.Name)
                                 st.rerun()
 
         st.divider()
@@ -288,59 +363,65 @@ else:
         if len(active_tasks) == 0:
             st.info("You don't have any active tasks currently in progress.")
         else:
-            for t in active_tasks:
-                icon = "⏳" if t['Status'] == "Pending" else "🚀"
-                with st.expander(f"{icon} [{t['Type']}] {t['Project']} - {t['Name']} ({t['Status']})"):
-                    st.write(f"**Due Date:** {t['Due']}")
-                    st.write(f"**Current Notes:**\n{t['Comments'] if pd.notna(t['Comments']) and t['Comments'].strip() and t['Comments'] != 'nan' else 'No notes provided.'}")
+            start, stop = paginate(len(active_tasks), "desk_active_page", DESK_PAGE_SIZE)
+            for t in active_tasks.iloc[start:stop].itertuples(index=False, name="DeskItem"):
+                icon = "⏳" if t.Status == "Pending" else "🚀"
+                exp = st.expander(f"{icon} [{t.Type}] {t.Project} - {t.Name} ({t.Status})", key=f"desk_exp_active_{t.Type}_{t.Idx}", on_change="rerun")
+                if not exp.open:
+                    continue
+                with exp:
+                    st.write(f"**Due Date:** {t.Due}")
+                    st.write(f"**Current Notes:**\n{t.Comments if pd.notna(t.Comments) and t.Comments.strip() and t.Comments != 'nan' else 'No notes provided.'}")
+                    show_activity("tasks" if t.Type == "Main" else "subtasks", t.Idx, f"active_{t.Type}_{t.Idx}")
                     
-                    if pd.notna(t['Attachments']) and t['Attachments'] != "" and t['Attachments'] != "nan":
+                    task_table = "tasks" if t.Type == "Main" else "subtasks"
+                    att_files = attachments.for_task(task_table, t.Idx)
+                    if not att_files.empty:
                         st.markdown("**📎 Task Attachments:**")
-                        att_files = t['Attachments'].split('|')
-                        for file_path in att_files:
-                            if os.path.exists(file_path):
-                                with open(file_path, "rb") as f:
-                                    st.download_button(label=f"⬇️ Download {os.path.basename(file_path).split('_', 1)[-1]}", data=f, file_name=os.path.basename(file_path).split('_', 1)[-1], key=f"dl_{t['Type']}_{t['Idx']}_{file_path}")
+                        for a in att_files.itertuples(index=False):
+                            if not os.path.exists(a.Path):
+                                continue
+                            if a.Mime.startswith("image/"):
+                                thumb = attachments.thumbnail(a.SHA256, a.Path)
+                                if thumb: st.image(thumb)
+                            # The file is only read when the button is clicked
+                            st.download_button(label=f"⬇️ Download {a.Name} ({attachments.human_size(a.Size)})", data=partial(attachments.read_bytes, a.Path), file_name=a.Name, mime=a.Mime, key=f"dl_{t.Type}_{t.Idx}_{a.Link}", on_click="ignore")
                     
                     st.write("")
-                    with st.form(f"update_active_{t['Type']}_{t['Idx']}"):
-                        new_status = st.selectbox("Update Status", ["Pending", "In Progress", "Completed"], index=["Pending", "In Progress", "Completed"].index(t['Status']))
+                    seen_ver = seen_version(f"update_active_{t.Type}_{t.Idx}", t.Version)
+                    with st.form(f"update_active_{t.Type}_{t.Idx}"):
+                        new_status = st.selectbox("Update Status", ["Pending", "In Progress", "Completed"], index=["Pending", "In Progress", "Completed"].index(t.Status))
                         added_comment = st.text_area("Add a progress update / final notes:")
                         
                         uploaded_file = st.file_uploader("Upload Document / Receipt (Optional)")
                         
                         if st.form_submit_button("💾 Save Progress"):
-                            final_comments = t['Comments'] if pd.notna(t['Comments']) and t['Comments'].strip() != "nan" else ""
-                            if added_comment.strip():
-                                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-                                final_comments = final_comments.strip() + f"\n[{timestamp}] {st.session_state.current_user}: {added_comment.strip()}"
+                            note_parts = [added_comment.strip()] if added_comment.strip() else []
+                            if new_status != t.Status:
+                                note_parts.append(f"Status set to {new_status}")
                                 
-                            final_atts = t['Attachments'] if pd.notna(t['Attachments']) and t['Attachments'] != "nan" else ""
                             if uploaded_file is not None:
-                                safe_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uploaded_file.name.replace('|', '')}"
-                                file_path = os.path.join("attachments", safe_filename)
-                                with open(file_path, "wb") as f:
-                                    f.write(uploaded_file.getbuffer())
-                                final_atts = file_path if not final_atts else final_atts + "|" + file_path
+                                note_parts.append(f"Attached {uploaded_file.name}")
                                 
-                            if t['Type'] == "Main":
-                                st.session_state.task_db.at[t['Idx'], "Status"] = new_status
-                                st.session_state.task_db.at[t['Idx'], "Comments"] = final_comments
-                                st.session_state.task_db.at[t['Idx'], "Attachments"] = final_atts
-                                save_data(st.session_state.task_db, "tasks")
-                            else:
-                                st.session_state.subtask_db.at[t['Idx'], "Status"] = new_status
-                                st.session_state.subtask_db.at[t['Idx'], "Comments"] = final_comments
-                                st.session_state.subtask_db.at[t['Idx'], "Attachments"] = final_atts
-                                save_data(st.session_state.subtask_db, "subtasks")
+                            event = (st.session_state.current_user, "UPDATED", "; ".join(note_parts)) if note_parts else None
+                            saved = store.update_row(task_table, t.Idx, {"Status": new_status}, expected_version=seen_ver, event=event)
+                            # The file is only stored once the update has won, so a conflict leaves nothing orphaned
+                            if saved and uploaded_file is not None:
+                                att_id = attachments.save_upload(uploaded_file)
+                                attachments.link(task_table, t.Idx, att_id, uploaded_file.name, st.session_state.current_user)
                                 
-                            st.session_state.inline_msg = {"loc": "desk_active", "msg": f"✅ Progress saved for '{t['Name']}'! Status: {new_status}"}
+                            if saved:
+                                st.session_state.inline_msg = {"loc": "desk_active", "msg": f"✅ Progress saved for '{t.Name}'! Status: {new_status}"}
+                            else:
+                                st.session_state.inline_msg = conflict_msg("desk_active", t.Name)
+                                if uploaded_file is not None:
+                                    st.session_state.inline_msg["msg"] += f" '{uploaded_file.name}' was not attached; please upload it again."
                             st.rerun()
 
-                    if t['Type'] == "Main":
+                    if t.Type == "Main":
                         st.markdown("---")
                         st.markdown("##### ➕ Create Subtask")
-                        with st.form(f"quick_add_sub_{t['Idx']}"):
+                        with st.form(f"quick_add_sub_{t.Idx}"):
                             s_name = st.text_input("Subtask Name")
                             c1, c2 = st.columns(2)
                             default_user_idx = user_list.index(st.session_state.current_user) if st.session_state.current_user in user_list else 0
@@ -349,9 +430,10 @@ else:
                             
                             if st.form_submit_button("Create Subtask"):
                                 if s_name:
-                                    new_sub = pd.DataFrame([{
-                                        "Project": t['Project'], 
-                                        "Parent Task": t['Name'], 
+                                    store.insert_row("subtasks", {
+                                        "Project": t.Project, 
+                                        "Parent Task": t.Name, 
+                                        "Parent Task ID": t.Idx, 
                                         "Subtask Name": s_name, 
                                         "Assignee": s_assignee, 
                                         "Status": "Pending", 
@@ -359,10 +441,8 @@ else:
                                         "Due Date": str(s_due), 
                                         "Comments": "",
                                         "Attachments": ""
-                                    }])
-                                    st.session_state.subtask_db = pd.concat([st.session_state.subtask_db, new_sub], ignore_index=True)
-                                    save_data(st.session_state.subtask_db, "subtasks")
-                                    st.session_state.inline_msg = {"loc": "desk_active", "msg": f"✅ Subtask '{s_name}' created under '{t['Name']}'!"}
+                                    })
+                                    st.session_state.inline_msg = {"loc": "desk_active", "msg": f"✅ Subtask '{s_name}' created under '{t.Name}'!"}
                                     st.rerun()
                                 else:
                                     st.error("Please provide a subtask name.")
@@ -373,7 +453,7 @@ else:
     elif active_tab == "📁 Project Workspace":
         st.subheader("📁 Project Workspace")
         
-        existing_projects = df["Project"].unique().tolist() if not df.empty else []
+        existing_projects = store.project_names()
         c1, c2 = st.columns([1, 2])
         project_selection = c1.selectbox("Select Workspace", ["-- Choose a Project --", "✨ Create New Project"] + existing_projects, key="ws_proj_sel")
         active_project = c2.text_input("Enter New Project Name", placeholder="e.g. Leririma Games 2026") if project_selection == "✨ Create New Project" else (project_selection if project_selection != "-- Choose a Project --" else None)
@@ -382,16 +462,13 @@ else:
             st.divider()
             st.markdown(f"### 📂 Project: {active_project}")
             
-            proj_df = df[df["Project"] == active_project]
-            proj_sub_df = sub_df_all[sub_df_all["Project"] == active_project]
-            
             m1, m2, m3 = st.columns(3)
-            tot_tasks = len(proj_df)
-            comp_tasks = len(proj_df[proj_df["Status"] == "Completed"])
-            pct = (comp_tasks / tot_tasks) if tot_tasks > 0 else 0.0
+            proj_summary = reports.report_summary(active_project)
+            tot_tasks = proj_summary["main_total"]
+            pct = (proj_summary["main_completed"] / tot_tasks) if tot_tasks > 0 else 0.0
             
             m1.metric("Total Main Tasks", tot_tasks)
-            m2.metric("Subtasks Attached", len(proj_sub_df))
+            m2.metric("Subtasks Attached", proj_summary["sub_total"])
             m3.metric("Overall Completion", f"{int(pct*100)}%")
             st.progress(pct)
             st.write("")
@@ -400,22 +477,41 @@ else:
             st.write("")
             
             if pw_tab == "🗂️ Project Board":
-                if proj_df.empty:
+                if tot_tasks == 0:
                     st.info("No tasks in this project yet. Go to 'Add New Task' to get started.")
                 else:
-                    for real_idx, m_row in proj_df.iterrows():
-                        with st.container(border=True):
-                            icon = "✅" if m_row['Status'] == "Completed" else "🔹"
-                            st.markdown(f"#### {icon} {m_row['Task Name']}")
-                            st.caption(f"**Assignee:** {m_row['Assignee']} | **Status:** {m_row['Status']} | **Due:** {m_row['Due Date']}")
-                            
-                            if pd.notna(m_row['Comments']) and str(m_row['Comments']).strip() != "nan" and str(m_row['Comments']).strip() != "":
-                                st.write(f"**Notes:** {m_row['Comments']}")
-                                
-                            m_subs = proj_sub_df[proj_sub_df["Parent Task"] == m_row["Task Name"]]
-                            if not m_subs.empty:
-                                st.markdown("**Subtasks:**")
-                                st.dataframe(m_subs[["Subtask Name", "Assignee", "Status", "Due Date"]], hide_index=True, use_container_width=True)
+                    # Each status column asks the database for one sorted, filtered page; subtasks load when a card is opened.
+                    reset_board = lambda: [st.session_state.pop(k) for k in list(st.session_state) if str(k).startswith("board_page_")]
+                    f1, f2, f3, f4 = st.columns([2, 2, 1, 1])
+                    b_text = f1.text_input("Filter tasks", placeholder="Task name contains...", key="board_text", on_change=reset_board)
+                    b_assignee = f2.selectbox("Assignee", ["All"] + user_list, key="board_assignee", on_change=reset_board)
+                    b_sort = f3.selectbox("Sort by", list(store.BOARD_SORTS), key="board_sort", on_change=reset_board)
+                    b_size = f4.selectbox("Per column", [5, 10, 25], index=1, key="board_size", on_change=reset_board)
+                    b_filters = dict(sort=b_sort, assignee=None if b_assignee == "All" else b_assignee, text=b_text.strip() or None)
+                    
+                    for col, status in zip(st.columns(3), ["Pending", "In Progress", "Completed"]):
+                        with col:
+                            page_key = f"board_page_{status}"
+                            _, total = store.board_page(active_project, status, 0, b_size, **b_filters)
+                            st.markdown(f"#### {'✅' if status == 'Completed' else '🔄' if status == 'In Progress' else '🕒'} {status} ({total})")
+                            start, _ = paginate(total, page_key, b_size)
+                            cards, _ = store.board_page(active_project, status, start // b_size, b_size, **b_filters)
+                            if cards.empty:
+                                st.caption("No tasks here.")
+                            for card in cards.itertuples(index=False):
+                                icon = "✅" if card.Status == "Completed" else "🔹"
+                                exp = st.expander(f"{icon} {card.Name}" + (f" ({card.Subtasks} subtask(s))" if card.Subtasks else ""), key=f"board_exp_{card.Idx}", on_change="rerun")
+                                st.caption(f"**Assignee:** {card.Assignee} | **Due:** {card.Due}")
+                                if not exp.open:
+                                    continue
+                                with exp:
+                                    if pd.notna(card.Comments) and str(card.Comments).strip() not in ("", "nan"):
+                                        st.write(f"**Notes:** {card.Comments}")
+                                    if card.Subtasks:
+                                        st.markdown("**Subtasks:**")
+                                        st.dataframe(store.subtasks_of(card.Idx), hide_index=True, use_container_width=True)
+                                    else:
+                                        st.caption("No subtasks.")
             
             elif pw_tab == "➕ Add New Task":
                 st.markdown("#### Create a New Main Task")
@@ -427,13 +523,13 @@ else:
                     t_due = st.date_input("Due Date")
                     t_comments = st.text_area("Comments")
                     if st.form_submit_button("Add Task") and t_name:
-                        new_task = pd.DataFrame([{"Project": active_project, "Task Name": t_name, "Assignee": t_assignee, "Status": t_status, "Date Added": datetime.now().strftime("%Y-%m-%d"), "Due Date": str(t_due), "Comments": t_comments, "Attachments": ""}])
-                        st.session_state.task_db = pd.concat([st.session_state.task_db, new_task], ignore_index=True)
-                        save_data(st.session_state.task_db, "tasks")
+                        store.insert_row("tasks", {"Project": active_project, "Task Name": t_name, "Assignee": t_assignee, "Status": t_status, "Date Added": datetime.now().strftime("%Y-%m-%d"), "Due Date": str(t_due), "Comments": t_comments, "Attachments": ""})
                         st.session_state.inline_msg = {"loc": "ws_add_main", "msg": f"✅ New task '{t_name}' added to {active_project}!"}
                         st.rerun()
 
             elif pw_tab == "⚙️ Edit Tasks & Subtasks":
+                proj_df = store.snapshot("tasks", where={"Project": active_project})
+                proj_sub_df = store.snapshot("subtasks", where={"Project": active_project})
                 update_col1, update_col2 = st.columns(2)
                 
                 with update_col1:
@@ -443,52 +539,48 @@ else:
                         task_dict = {idx: row["Task Name"] for idx, row in proj_df.iterrows()}
                         selected_idx = st.selectbox("Select Task to Edit", options=list(task_dict.keys()), format_func=lambda x: task_dict[x])
                         if selected_idx is not None:
-                            curr_assig = df.at[selected_idx, "Assignee"]
+                            curr_assig = proj_df.at[selected_idx, "Assignee"]
+                            seen_ver = seen_version(f"workspace_update_form_{selected_idx}", proj_df.at[selected_idx, "Row Version"])
                             with st.form("workspace_update_form"):
                                 new_assignee = st.selectbox("Reassign To", user_list, index=user_list.index(curr_assig) if curr_assig in user_list else 0)
-                                new_status = st.selectbox("Status", ["Pending", "In Progress", "Completed"], index=["Pending", "In Progress", "Completed"].index(df.at[selected_idx, "Status"]))
-                                new_comments = st.text_area("Comments", value=str(df.at[selected_idx, "Comments"]))
+                                new_status = st.selectbox("Status", ["Pending", "In Progress", "Completed"], index=["Pending", "In Progress", "Completed"].index(proj_df.at[selected_idx, "Status"]))
+                                new_comments = st.text_area("Comments", value=str(proj_df.at[selected_idx, "Comments"]))
                                 if st.form_submit_button("Save Updates"):
-                                    if new_assignee != curr_assig: 
-                                        new_comments += f"\n[Forwarded to {new_assignee}]"
-                                    st.session_state.task_db.at[selected_idx, "Assignee"] = new_assignee
-                                    st.session_state.task_db.at[selected_idx, "Status"] = new_status
-                                    st.session_state.task_db.at[selected_idx, "Comments"] = new_comments
-                                    save_data(st.session_state.task_db, "tasks")
-                                    st.session_state.inline_msg = {"loc": "ws_upd_main", "msg": "✅ Task successfully updated!"}
+                                    event = (st.session_state.current_user, "REASSIGNED", f"from {curr_assig} to {new_assignee}") if new_assignee != curr_assig else None
+                                    saved = store.update_row("tasks", selected_idx, {"Assignee": new_assignee, "Status": new_status, "Comments": new_comments}, expected_version=seen_ver, event=event)
+                                    st.session_state.inline_msg = {"loc": "ws_upd_main", "msg": "✅ Task successfully updated!"} if saved else conflict_msg("ws_upd_main", proj_df.at[selected_idx, "Task Name"])
                                     st.rerun()
                                     
                 with update_col2:
                     st.markdown("**⚙️ Manage Subtasks**")
                     show_inline_msg("ws_sub_mng")
                     if not proj_df.empty:
-                        parent_task = st.selectbox("Select Parent Task:", ["-- Select --"] + proj_df["Task Name"].tolist())
-                        if parent_task != "-- Select --":
+                        parent_id = st.selectbox("Select Parent Task:", [None] + proj_df.index.tolist(), format_func=lambda x: "-- Select --" if x is None else proj_df.at[x, "Task Name"])
+                        if parent_id is not None:
+                            parent_task = proj_df.at[parent_id, "Task Name"]
                             with st.expander("➕ Add Subtask", expanded=False):
                                 with st.form("add_sub_form", clear_on_submit=True):
                                     s_name = st.text_input("Subtask Name")
                                     s_assignee = st.selectbox("Assign To", user_list)
                                     s_due = st.date_input("Due Date")
                                     if st.form_submit_button("Create Subtask") and s_name:
-                                        new_sub = pd.DataFrame([{"Project": active_project, "Parent Task": parent_task, "Subtask Name": s_name, "Assignee": s_assignee, "Status": "Pending", "Date Added": datetime.now().strftime("%Y-%m-%d"), "Due Date": str(s_due), "Comments": "", "Attachments": ""}])
-                                        st.session_state.subtask_db = pd.concat([st.session_state.subtask_db, new_sub], ignore_index=True)
-                                        save_data(st.session_state.subtask_db, "subtasks")
+                                        store.insert_row("subtasks", {"Project": active_project, "Parent Task": parent_task, "Parent Task ID": parent_id, "Subtask Name": s_name, "Assignee": s_assignee, "Status": "Pending", "Date Added": datetime.now().strftime("%Y-%m-%d"), "Due Date": str(s_due), "Comments": "", "Attachments": ""})
                                         st.session_state.inline_msg = {"loc": "ws_sub_mng", "msg": f"✅ New subtask '{s_name}' added!"}
                                         st.rerun()
                                         
-                            active_subtasks = sub_df_all[(sub_df_all["Project"] == active_project) & (sub_df_all["Parent Task"] == parent_task)]
+                            active_subtasks = store.snapshot("subtasks", where={"Parent Task ID": parent_id})
                             if not active_subtasks.empty:
                                 with st.expander("✏️ Edit Subtask", expanded=False):
                                     sub_dict = {idx: row["Subtask Name"] for idx, row in active_subtasks.iterrows()}
                                     sub_idx = st.selectbox("Select Subtask", options=list(sub_dict.keys()), format_func=lambda x: sub_dict[x])
                                     if sub_idx is not None:
+                                        seen_ver = seen_version(f"update_sub_form_{sub_idx}", active_subtasks.at[sub_idx, "Row Version"])
                                         with st.form("update_sub_form"):
-                                            s_curr_status = sub_df_all.at[sub_idx, "Status"]
+                                            s_curr_status = active_subtasks.at[sub_idx, "Status"]
                                             new_s_status = st.selectbox("Status", ["Pending", "In Progress", "Completed"], index=["Pending", "In Progress", "Completed"].index(s_curr_status))
                                             if st.form_submit_button("Save Subtask Updates"):
-                                                st.session_state.subtask_db.at[sub_idx, "Status"] = new_s_status
-                                                save_data(st.session_state.subtask_db, "subtasks")
-                                                st.session_state.inline_msg = {"loc": "ws_sub_mng", "msg": "✅ Subtask successfully updated!"}
+                                                saved = store.update_row("subtasks", sub_idx, {"Status": new_s_status}, expected_version=seen_ver)
+                                                st.session_state.inline_msg = {"loc": "ws_sub_mng", "msg": "✅ Subtask successfully updated!"} if saved else conflict_msg("ws_sub_mng", sub_dict[sub_idx])
                                                 st.rerun()
 
     # ==========================================
@@ -498,44 +590,40 @@ else:
         st.subheader("📅 Project Calendar & Visual Timeline")
         st.markdown("Track exactly when tasks begin and when they are due.")
         
-        m_cal = df.copy()
-        s_cal = sub_df_all.copy()
+        cal_df = store.timeline()
         
-        if m_cal.empty and s_cal.empty:
+        if cal_df.empty:
             st.info("No tasks to display on the calendar.")
         else:
-            if not m_cal.empty: m_cal["Task Display"] = "[Main] " + m_cal["Task Name"]
-            if not s_cal.empty: s_cal["Task Display"] = "[Sub] " + s_cal["Subtask Name"]
+            today = pd.Timestamp.now().normalize()
+            f1, f2 = st.columns([2, 1])
+            cal_projects = f1.multiselect("Projects", sorted(cal_df["Project"].unique()), placeholder="All projects", key="cal_projects")
+            cal_window = f2.date_input("Visible window", value=((today - pd.Timedelta(days=90)).date(), (today + pd.Timedelta(days=90)).date()), key="cal_window")
             
-            cal_df = pd.concat([
-                m_cal[["Project", "Task Display", "Assignee", "Status", "Date Added", "Due Date"]] if not m_cal.empty else pd.DataFrame(columns=["Project", "Task Display", "Assignee", "Status", "Date Added", "Due Date"]),
-                s_cal[["Project", "Task Display", "Assignee", "Status", "Date Added", "Due Date"]] if not s_cal.empty else pd.DataFrame(columns=["Project", "Task Display", "Assignee", "Status", "Date Added", "Due Date"])
-            ], ignore_index=True)
+            if cal_projects:
+                cal_df = cal_df[cal_df["Project"].isin(cal_projects)]
+            win_start, win_end = (pd.Timestamp(cal_window[0]), pd.Timestamp(cal_window[-1])) if cal_window else (cal_df["Start"].min(), cal_df["End"].max())
+            visible = cal_df[(cal_df["End"] >= win_start) & (cal_df["Start"] <= win_end + pd.Timedelta(days=1))]
             
-            cal_df["Start"] = pd.to_datetime(cal_df["Date Added"], errors='coerce')
-            cal_df["End"] = pd.to_datetime(cal_df["Due Date"], errors='coerce')
-            cal_df["End"] = cal_df.apply(lambda x: x["Start"] + pd.Timedelta(days=1) if pd.isna(x["End"]) or x["Start"] == x["End"] else x["End"], axis=1)
-            cal_df = cal_df.dropna(subset=["Start", "End"])
-            
-            if not cal_df.empty:
-                cal_df = cal_df.sort_values("End")
-                if HAS_PLOTLY:
-                    fig = px.timeline(cal_df, x_start="Start", x_end="End", y="Task Display", color="Project", hover_name="Assignee", hover_data=["Status", "Due Date"], height=500)
-                    fig.update_yaxes(autorange="reversed") 
-                    st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.warning("⚠️ **Plotly Required:** To see the visual timeline, please add `plotly` to your requirements.txt file and reboot.")
+            if visible.empty:
+                st.info("No tasks fall inside the selected window.")
+            elif HAS_PLOTLY:
+                import plotly.express as px
+                fig = px.timeline(visible, x_start="Start", x_end="End", y="Task Display", color="Project", hover_name="Assignee", hover_data=["Status", "Due Date"], height=500)
+                fig.update_yaxes(autorange="reversed") 
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.warning("⚠️ **Plotly Required:** To see the visual timeline, please add `plotly` to your requirements.txt file and reboot.")
 
-                st.divider()
-                st.markdown("#### 🚨 Upcoming Deadlines (Next 7 Days)")
-                today = pd.Timestamp.now().normalize()
-                next_week = today + pd.Timedelta(days=7)
-                
-                upcoming = cal_df[(cal_df["End"] >= today) & (cal_df["End"] <= next_week) & (cal_df["Status"] != "Completed")]
-                if upcoming.empty:
-                    st.success("You are all clear! No pending deadlines in the next 7 days. 🎉")
-                else:
-                    st.dataframe(upcoming[["Project", "Task Display", "Assignee", "Status", "Due Date"]].rename(columns={"Task Display": "Task"}), hide_index=True, use_container_width=True)
+            st.divider()
+            st.markdown("#### 🚨 Upcoming Deadlines (Next 7 Days)")
+            today_day = store.today_day()
+            
+            upcoming = store.open_deadlines(min_day=today_day, max_day=today_day + 7, projects=cal_projects)
+            if upcoming.empty:
+                st.success("You are all clear! No pending deadlines in the next 7 days. 🎉")
+            else:
+                st.dataframe(upcoming[["Project", "Task Display", "Assignee", "Status", "Due Date"]].rename(columns={"Task Display": "Task"}), hide_index=True, use_container_width=True)
 
     # ==========================================
     # --- TAB 4: REPORTS (UPGRADED) ---
@@ -544,50 +632,37 @@ else:
         st.subheader("📊 Executive Analytics Dashboard")
         
         # 1. Executive Filtering
-        all_projects = ["All Projects"] + df["Project"].unique().tolist()
+        all_projects = ["All Projects"] + store.project_names()
         filter_proj = st.selectbox("🎛️ Filter by Project:", all_projects)
-        
-        if filter_proj == "All Projects":
-            rep_df = df.copy()
-            rep_sub_df = sub_df_all.copy()
-        else:
-            rep_df = df[df["Project"] == filter_proj].copy()
-            rep_sub_df = sub_df_all[sub_df_all["Project"] == filter_proj].copy()
+        report_project = None if filter_proj == "All Projects" else filter_proj
+        summary = reports.report_summary(report_project)
             
-        if rep_df.empty and rep_sub_df.empty:
+        if summary["main_total"] == 0 and summary["sub_total"] == 0:
             st.info("No data available for the selected filters.")
         else:
             # Metrics
             c1, c2, c3 = st.columns(3)
-            c1.metric("Total Main Tasks", len(rep_df))
-            c2.metric("✅ Tasks Completed", len(rep_df[rep_df["Status"] == "Completed"]))
-            c3.metric("Total Subtasks", len(rep_sub_df))
+            c1.metric("Total Main Tasks", summary["main_total"])
+            c2.metric("✅ Tasks Completed", summary["main_completed"])
+            c3.metric("Total Subtasks", summary["sub_total"])
             
             st.divider()
             
-            # Combine tasks for holistic analytics
-            combined_rep = pd.concat([
-                rep_df[["Task Name", "Assignee", "Status", "Due Date", "Project"]].rename(columns={"Task Name": "Task Display"}),
-                rep_sub_df[["Subtask Name", "Assignee", "Status", "Due Date", "Project"]].rename(columns={"Subtask Name": "Task Display"})
-            ], ignore_index=True)
-            
             # 2. Interactive Analytics (Charts)
-            if HAS_PLOTLY and not combined_rep.empty:
+            if HAS_PLOTLY:
+                import plotly.express as px
                 st.markdown("#### 📈 Visual Analytics")
                 ch1, ch2 = st.columns(2)
                 
                 with ch1:
                     st.write("**Task Status Distribution**")
-                    status_counts = combined_rep["Status"].value_counts().reset_index()
-                    status_counts.columns = ["Status", "Count"]
-                    fig_pie = px.pie(status_counts, names="Status", values="Count", hole=0.4, color="Status", 
+                    fig_pie = px.pie(summary["status_counts"], names="Status", values="Count", hole=0.4, color="Status", 
                                      color_discrete_map={"Completed":"#22c55e", "In Progress":"#3b82f6", "Pending":"#f59e0b"})
                     st.plotly_chart(fig_pie, use_container_width=True)
                     
                 with ch2:
                     st.write("**Team Workload (Active vs Completed)**")
-                    workload = combined_rep.groupby(["Assignee", "Status"]).size().reset_index(name="Tasks")
-                    fig_bar = px.bar(workload, x="Assignee", y="Tasks", color="Status", text="Tasks", barmode="stack",
+                    fig_bar = px.bar(summary["workload"], x="Assignee", y="Tasks", color="Status", text="Tasks", barmode="stack",
                                      color_discrete_map={"Completed":"#22c55e", "In Progress":"#3b82f6", "Pending":"#f59e0b"})
                     st.plotly_chart(fig_bar, use_container_width=True)
             
@@ -595,15 +670,12 @@ else:
             
             # 3. The "Red Zone" (Overdue Task Alerts)
             st.markdown("#### 🚨 The 'Red Zone' (Overdue Tasks)")
-            combined_rep["Safe Due"] = pd.to_datetime(combined_rep["Due Date"], errors="coerce")
-            today_ts = pd.Timestamp.now().normalize()
-            
-            overdue_df = combined_rep[(combined_rep["Safe Due"] < today_ts) & (combined_rep["Status"] != "Completed")].copy()
+            today_day = store.today_day()
+            overdue_df = store.open_deadlines(max_day=today_day - 1, projects=None if report_project is None else [report_project])
             if overdue_df.empty:
                 st.success("✅ Excellent! No tasks are currently overdue.")
             else:
-                overdue_df["Days Overdue"] = (today_ts - overdue_df["Safe Due"]).dt.days
-                overdue_display = overdue_df[["Project", "Task Display", "Assignee", "Status", "Days Overdue"]].sort_values("Days Overdue", ascending=False)
+                overdue_display = overdue_df[["Project", "Task Display", "Assignee", "Status"]].assign(**{"Days Overdue": today_day - overdue_df["Due Day"]})
                 st.error(f"⚠️ Warning: You have {len(overdue_display)} task(s) past their deadline!")
                 st.dataframe(overdue_display, hide_index=True, use_container_width=True)
                 
@@ -612,29 +684,16 @@ else:
             col_hp, col_tm = st.columns(2)
             with col_hp:
                 st.markdown("#### 📊 Project Health")
-                for proj in rep_df["Project"].unique():
-                    p_df = rep_df[rep_df["Project"] == proj]
-                    p_tot = len(p_df)
-                    p_comp = len(p_df[p_df["Status"] == "Completed"])
-                    p_pct = (p_comp / p_tot) if p_tot > 0 else 0.0
-                    st.write(f"**{proj}** ({p_comp}/{p_tot} Main Tasks)")
-                    st.progress(p_pct)
+                for proj in summary["project_health"].itertuples(index=False):
+                    st.write(f"**{proj.Project}** ({proj.Completed}/{proj.Total} Main Tasks)")
+                    st.progress(float(proj.Pct))
                     st.write("")
                     
             with col_tm:
                 st.markdown("#### 📈 Team Matrix")
-                matrix_data = []
-                for user in combined_rep["Assignee"].dropna().unique():
-                    u_tasks = combined_rep[combined_rep["Assignee"] == user]
-                    u_tot = len(u_tasks)
-                    u_comp = len(u_tasks[u_tasks["Status"] == "Completed"])
-                    u_pct = int((u_comp / u_tot) * 100) if u_tot > 0 else 0
-                    matrix_data.append({"Team Member": user, "Total Load": u_tot, "Completed": u_comp, "Efficiency %": u_pct})
-                
-                if matrix_data:
-                    matrix_df = pd.DataFrame(matrix_data)
+                if not summary["team_matrix"].empty:
                     st.dataframe(
-                        matrix_df,
+                        summary["team_matrix"],
                         column_config={"Efficiency %": st.column_config.ProgressColumn("Efficiency Rate", format="%d%%", min_value=0, max_value=100)},
                         hide_index=True, use_container_width=True
                     )
@@ -644,9 +703,20 @@ else:
             ex1, ex2 = st.columns(2)
             with ex1:
                 if HAS_PPTX:
-                    st.download_button("📊 Download PowerPoint", data=create_ppt(rep_df, rep_sub_df), file_name=f"Report_{datetime.now().strftime('%Y%m%d')}.pptx")
+                    deck_export(report_project)
             with ex2:
-                st.download_button("📈 Download CSV Export", data=rep_df.to_csv(index=False).encode('utf-8'), file_name=f"Data_{datetime.now().strftime('%Y%m%d')}.csv")
+                # Files are only generated when the download is clicked, streamed from the database in chunks
+                sources = [name for name in exports.EXPORT_SOURCES if name != "Mail" or st.session_state.is_admin]
+                ex_src, ex_fmt = st.columns(2)
+                export_source = ex_src.selectbox("Dataset", sources, key="export_source")
+                export_format = ex_fmt.selectbox("Format", exports.available_formats(), key="export_format")
+                export_project = report_project if exports.EXPORT_SOURCES[export_source][1] else None
+                st.download_button(
+                    f"📈 Download {export_format} Export",
+                    data=partial(exports.export_bytes, export_source, export_format, export_project),
+                    file_name=exports.export_name(export_source, export_format, export_project, datetime.now().strftime('%Y%m%d')),
+                    mime=exports.EXPORT_FORMATS[export_format][2], on_click="ignore"
+                )
 
     # ==========================================
     # --- TAB 5: TEAM COMMUNICATIONS ---
@@ -659,44 +729,59 @@ else:
         st.write("")
         
         if comm_tab == "💬 Global Team Chat":
-            st.session_state.chat_db = load_data("chat", ["Timestamp", "User", "Message"])
-            chat_container = st.container(height=400)
-            with chat_container:
-                if st.session_state.chat_db.empty:
-                    st.caption("No messages yet. Say hello!")
-                else:
-                    for _, msg in st.session_state.chat_db.tail(20).iterrows():
-                        is_me = (msg["User"] == st.session_state.current_user)
-                        with st.chat_message("user" if is_me else "assistant"):
-                            st.markdown(f"**{msg['User']}** <span style='font-size:0.8em; color:gray;'>({msg['Timestamp']})</span>", unsafe_allow_html=True)
-                            st.write(msg["Message"])
+            chat_feed()
             
             with st.form("chat_form", clear_on_submit=True):
                 m = st.text_input("Type your message to the team...")
-                c1, c2 = st.columns(2)
-                if c1.form_submit_button("📨 Send Message") and m:
-                    new_c = pd.DataFrame([{"Timestamp": datetime.now().strftime("%H:%M"), "User": st.session_state.current_user, "Message": m}])
-                    st.session_state.chat_db = pd.concat([st.session_state.chat_db, new_c], ignore_index=True)
-                    save_data(st.session_state.chat_db, "chat")
+                if st.form_submit_button("📨 Send Message") and m:
+                    store.insert_row("chat", {"Timestamp": store.now_stamp(), "User": st.session_state.current_user, "Message": m})
                     st.rerun()
-                if c2.form_submit_button("🔄 Refresh Chat"): st.rerun()
 
         elif comm_tab == "📥 Mail Inbox":
             show_inline_msg("mail_inbox")
-            my_mail = st.session_state.mail_db[st.session_state.mail_db["To"] == st.session_state.current_user]
-            if my_mail.empty:
-                st.info("Your inbox is empty.")
+            me = st.session_state.current_user
+            mb1, mb2, mb3 = st.columns([2, 1, 1])
+            unread_only = mb1.toggle("Unread only", key="mail_unread_only", on_change=lambda: st.session_state.pop("mail_cursors", None))
+            
+            # Keyset pagination: the stack holds the "before id" of every page above the current one
+            cursors = st.session_state.setdefault("mail_cursors", [])
+            page = store.mail_page(me, before_id=cursors[-1] if cursors else None, unread_only=unread_only, limit=store.MAIL_PAGE_SIZE + 1)
+            has_older, page = len(page) > store.MAIL_PAGE_SIZE, page.head(store.MAIL_PAGE_SIZE)
+            
+            if page.empty:
+                st.info("No unread mail." if unread_only else "Your inbox is empty.")
             else:
-                for idx, row in my_mail.sort_index(ascending=False).iterrows():
-                    unread_tag = "🔴 [NEW]" if row["Read"] == "No" else "⚪"
-                    with st.expander(f"{unread_tag} {row['Subject']} - From: {row['From']} ({row['Timestamp']})"):
-                        st.write(row["Message"])
-                        if row["Read"] == "No":
-                            if st.button("Mark as Read", key=f"read_mail_{idx}"):
-                                st.session_state.mail_db.at[idx, "Read"] = "Yes"
-                                save_data(st.session_state.mail_db, "mail")
-                                st.session_state.inline_msg = {"loc": "mail_inbox", "msg": "✅ Mail marked as read."}
-                                st.rerun()
+                # Group the page by thread so a conversation shows once, under its newest message
+                for key, thread in page.groupby("Thread Key", sort=False):
+                    newest = thread.iloc[0]
+                    unread_tag = "🔴 [NEW]" if (thread["Read"] == "No").any() else "⚪"
+                    exp = st.expander(f"{unread_tag} {newest['Subject']} - From: {newest['From']} ({newest['Timestamp']})", key=f"mail_exp_{thread.index[0]}", on_change="rerun")
+                    if not exp.open: continue
+                    with exp:
+                        for idx, row in store.mail_thread(me, key).iterrows():
+                            st.markdown(f"**{row['From']}** → {row['To']} <span style='font-size:0.8em; color:gray;'>({row['Timestamp']})</span>", unsafe_allow_html=True)
+                            st.write(row["Message"])
+                            if row["To"] == me and row["Read"] == "No":
+                                st.checkbox("Select to mark as read", key=f"mail_sel_{idx}")
+                            st.divider()
+                
+                selected = [int(k.rsplit("_", 1)[1]) for k, v in st.session_state.items() if str(k).startswith("mail_sel_") and v]
+                if mb2.button("✅ Mark Selected Read", disabled=not selected):
+                    n = store.mark_mail_read(me, selected)
+                    st.session_state.inline_msg = {"loc": "mail_inbox", "msg": f"✅ {n} mail(s) marked as read."}
+                    st.rerun()
+            if mb3.button("📭 Mark All Read", disabled=store.unread_mail(me) == 0):
+                n = store.mark_mail_read(me)
+                st.session_state.inline_msg = {"loc": "mail_inbox", "msg": f"✅ {n} mail(s) marked as read."}
+                st.rerun()
+            
+            nav1, nav2 = st.columns(2)
+            if cursors and nav1.button("⬅️ Newer", key="mail_newer"):
+                cursors.pop()
+                st.rerun()
+            if has_older and nav2.button("Older ➡️", key="mail_older"):
+                cursors.append(int(page.index[-1]))
+                st.rerun()
 
         elif comm_tab == "📤 Compose Mail":
             show_inline_msg("mail_compose") 
@@ -706,16 +791,14 @@ else:
                 msg = st.text_area("Your Message")
                 if st.form_submit_button("Send Secure Mail"):
                     if subject and msg:
-                        new_mail = pd.DataFrame([{
+                        store.insert_row("mail", {
                             "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
                             "From": st.session_state.current_user,
                             "To": to_user,
                             "Subject": subject,
                             "Message": msg,
                             "Read": "No"
-                        }])
-                        st.session_state.mail_db = pd.concat([st.session_state.mail_db, new_mail], ignore_index=True)
-                        save_data(st.session_state.mail_db, "mail")
+                        })
                         st.session_state.inline_msg = {"loc": "mail_compose", "msg": f"✅ Secure mail successfully sent to {to_user}!"}
                         st.rerun()
                     else:
@@ -725,6 +808,10 @@ else:
     # --- TAB 6: AI PROJECT MANAGER ---
     # ==========================================
     elif active_tab == "🧠 AI Project Manager":
+        # The AI client (and requests) is only loaded once someone opens this tab
+        import badiri_ai as ai
+        import badiri_mining as mining
+        import badiri_vision as vision
         st.subheader("🧠 Your AI Project Manager")
         st.markdown("👋 **Hello! I am your Badiri AI Assistant.**\n\nI can help you automate your workspace. Generate a whole project from a single sentence, scan meeting minutes, or mine the Team Chat!")
         
@@ -739,11 +826,9 @@ else:
             plan_prompt = st.text_input("Describe the project:", placeholder="e.g., Organize a constituency cleanup campaign for 500 people...")
             if st.form_submit_button("🏗️ Build Project Plan"):
                 if gemini_key and plan_prompt:
-                    with st.spinner("Drafting tasks..."):
-                        full_prompt = f"You are an expert Project Manager. I need to plan this: '{plan_prompt}'. Create a comprehensive project plan. Return strictly a JSON list of objects with these keys: 'Project' (a short unifying project name), 'Task Name', 'Assignee' (always output 'Unassigned'). Do not include markdown or explanations."
-                        res = requests.post(f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_key}", json={"contents": [{"parts": [{"text": full_prompt}]}]}).json()
-                        if 'candidates' in res: 
-                            st.session_state.plan_ai_suggestions = json.loads(res['candidates'][0]['content']['parts'][0]['text'].replace("```json","").replace("```","").strip())
+                    full_prompt = f"You are an expert Project Manager. I need to plan this: '{plan_prompt}'. Create a comprehensive project plan. Return strictly a JSON list of objects with these keys: 'Project' (a short unifying project name), 'Task Name', 'Assignee' (always output 'Unassigned'). Do not include markdown or explanations."
+                    st.session_state.ai_job_plan = ai.submit_tasks(gemini_key, [ai.text_part(full_prompt)], user_list)
+        collect_ai_job("ai_job_plan", "plan_ai_suggestions", "Drafting tasks...")
         
         if st.session_state.plan_ai_suggestions and st.session_state.is_admin:
             show_inline_msg("ai_plan") 
@@ -751,28 +836,27 @@ else:
                 st.write("**Select tasks to import into Workspace:**")
                 plan_sels = [st.checkbox(f"{it['Task Name']}", value=True, key=f"plan_c_{i}") for i, it in enumerate(st.session_state.plan_ai_suggestions)]
                 if st.form_submit_button("✅ Approve Selected Plan"):
-                    added = 0
-                    for i, sel in enumerate(plan_sels):
-                        if sel: 
-                            st.session_state.task_db = pd.concat([st.session_state.task_db, pd.DataFrame([{"Project": st.session_state.plan_ai_suggestions[i]['Project'], "Task Name": st.session_state.plan_ai_suggestions[i]['Task Name'], "Assignee": st.session_state.plan_ai_suggestions[i]['Assignee'], "Status": "Pending", "Date Added": datetime.now().strftime("%Y-%m-%d"), "Due Date": datetime.now().strftime("%Y-%m-%d"), "Comments": "AI Auto-Generated Plan", "Attachments": ""}])], ignore_index=True)
-                            added += 1
-                    save_data(st.session_state.task_db, "tasks")
+                    added, skipped = approve_ai_tasks(st.session_state.plan_ai_suggestions, plan_sels, "AI Auto-Generated Plan")
                     st.session_state.plan_ai_suggestions = []
-                    st.session_state.inline_msg = {"loc": "ai_plan", "msg": f"✅ {added} tasks imported from the AI Planner!"}
+                    st.session_state.inline_msg = {"loc": "ai_plan", "msg": import_msg(added, skipped, "the AI Planner")}
                     st.rerun()
 
         st.divider()
 
         # --- EXTRACT FROM IMAGE ---
         st.markdown("#### 📷 Extract Tasks from Minutes (Image)")
-        img_file = st.file_uploader("Upload Minutes", type=["jpg", "png"])
+        img_file = st.file_uploader("Upload Minutes", type=["jpg", "jpeg", "png", "webp", "gif"] + (["pdf"] if vision.HAS_PDF and vision.HAS_PIL else []))
         if st.button("🔍 Analyze Minutes"):
             if gemini_key and img_file:
-                with st.spinner("Analyzing document..."):
-                    b64 = base64.b64encode(img_file.read()).decode('utf-8')
-                    prompt = f"Extract tasks as JSON list with keys: Project, Task Name, Assignee. Use only these names: {user_list}"
-                    res = requests.post(f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_key}", json={"contents": [{"parts": [{"text": prompt}, {"inline_data": {"mime_type": "image/jpeg", "data": b64}}]}]}).json()
-                    if 'candidates' in res: st.session_state.ai_suggestions = json.loads(res['candidates'][0]['content']['parts'][0]['text'].replace("```json","").replace("```","").strip())
+                prompt = f"Extract tasks as JSON list with keys: Project, Task Name, Assignee. Use only these names: {user_list}"
+                try:
+                    pages, st.session_state.ai_img_skipped_pages = vision.prepare_upload(img_file.getvalue())
+                    st.session_state.ai_job_img = ai.submit_task_batches(gemini_key, [[ai.text_part(prompt), ai.image_part(data, mime)] for data, mime in pages], user_list)
+                except vision.UnsupportedUpload as e:
+                    st.error(f"❌ {e}")
+        if st.session_state.get("ai_img_skipped_pages"):
+            st.warning(f"⚠️ Only the first {vision.MAX_PDF_PAGES} pages were analyzed; {st.session_state.ai_img_skipped_pages} later page(s) were skipped.")
+        collect_ai_job("ai_job_img", "ai_suggestions", "Analyzing document...")
         
         if st.session_state.ai_suggestions and st.session_state.is_admin:
             show_inline_msg("ai_img") 
@@ -780,42 +864,38 @@ else:
                 st.write("**Select items to import into Workspace:**")
                 img_sels = [st.checkbox(f"{it['Project']} | {it['Task Name']} ({it['Assignee']})", value=True, key=f"img_c_{i}") for i, it in enumerate(st.session_state.ai_suggestions)]
                 if st.form_submit_button("✅ Approve Selected"):
-                    added = 0
-                    for i, sel in enumerate(img_sels):
-                        if sel: 
-                            st.session_state.task_db = pd.concat([st.session_state.task_db, pd.DataFrame([{"Project": st.session_state.ai_suggestions[i]['Project'], "Task Name": st.session_state.ai_suggestions[i]['Task Name'], "Assignee": st.session_state.ai_suggestions[i]['Assignee'], "Status": "Pending", "Date Added": datetime.now().strftime("%Y-%m-%d"), "Due Date": datetime.now().strftime("%Y-%m-%d"), "Comments": "AI extracted", "Attachments": ""}])], ignore_index=True)
-                            added += 1
-                    save_data(st.session_state.task_db, "tasks")
+                    added, skipped = approve_ai_tasks(st.session_state.ai_suggestions, img_sels, "AI extracted")
                     st.session_state.ai_suggestions = []
-                    st.session_state.inline_msg = {"loc": "ai_img", "msg": f"✅ {added} task(s) imported from the document!"}
+                    st.session_state.inline_msg = {"loc": "ai_img", "msg": import_msg(added, skipped, "the document")}
                     st.rerun()
 
         st.divider()
 
         # --- EXTRACT FROM CHAT ---
         st.markdown("#### 💬 Extract Tasks from Chat logs")
-        if st.button("🧠 Analyze Chat Logs"):
-            if gemini_key and not st.session_state.chat_db.empty:
-                with st.spinner("Mining chat..."):
-                    transcript = "\n".join([f"{r['User']}: {r['Message']}" for _, r in st.session_state.chat_db.tail(30).iterrows()])
-                    prompt = f"Extract tasks from chat as JSON list with keys: Project, Task Name, Assignee. Names: {user_list}\n\nCHAT:\n{transcript}"
-                    res = requests.post(f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_key}", json={"contents": [{"parts": [{"text": prompt}]}]}).json()
-                    if 'candidates' in res: st.session_state.chat_ai_suggestions = json.loads(res['candidates'][0]['content']['parts'][0]['text'].replace("```json","").replace("```","").strip())
-
-        if st.session_state.chat_ai_suggestions and st.session_state.is_admin:
-            show_inline_msg("ai_chat") 
+        st.caption("Only messages posted since the last analysis are sent; tasks already suggested or in the workspace are left out.")
+        if not st.session_state.is_admin:
+            st.info("🔒 Only admins can analyze the chat and review its suggestions.")
+        elif st.button("🧠 Analyze Chat Logs"):
+            if gemini_key:
+                st.session_state.ai_job_chat = mining.mine_chat(gemini_key, user_list)
+                if st.session_state.ai_job_chat is None:
+                    del st.session_state.ai_job_chat
+                    st.info("💤 No new chat messages since the last analysis.")
+        collect_ai_job("ai_job_chat", None, "Mining chat...")
+
+        # Mined suggestions wait in the database until an admin approves or dismisses them
+        pending_chat = store.snapshot("ai_suggestions", where={"Source": mining.CHAT_SOURCE, "Status": "Pending"}) if st.session_state.is_admin else None
+        show_inline_msg("ai_chat") 
+        if pending_chat is not None and not pending_chat.empty:
             with st.form("chat_approval"):
-                st.write("**Select chat promises to import:**")
-                chat_sels = [st.checkbox(f"{it['Project']} | {it['Task Name']} ({it['Assignee']})", value=True, key=f"chat_c_{i}") for i, it in enumerate(st.session_state.chat_ai_suggestions)]
+                st.write("**Select chat promises to import** (unticked ones are dismissed):")
+                chat_items = pending_chat[["Project", "Task Name", "Assignee"]].to_dict("records")
+                chat_sels = [st.checkbox(f"{it['Project']} | {it['Task Name']} ({it['Assignee']})", value=True, key=f"chat_c_{i}") for i, it in zip(pending_chat.index, chat_items)]
                 if st.form_submit_button("✅ Approve Selected"):
-                    added = 0
-                    for i, sel in enumerate(chat_sels):
-                        if sel: 
-                            st.session_state.task_db = pd.concat([st.session_state.task_db, pd.DataFrame([{"Project": st.session_state.chat_ai_suggestions[i]['Project'], "Task Name": st.session_state.chat_ai_suggestions[i]['Task Name'], "Assignee": st.session_state.chat_ai_suggestions[i]['Assignee'], "Status": "Pending", "Date Added": datetime.now().strftime("%Y-%m-%d"), "Due Date": datetime.now().strftime("%Y-%m-%d"), "Comments": "Chat AI extracted", "Attachments": ""}])], ignore_index=True)
-                            added += 1
-                    save_data(st.session_state.task_db, "tasks")
-                    st.session_state.chat_ai_suggestions = []
-                    st.session_state.inline_msg = {"loc": "ai_chat", "msg": f"✅ {added} task(s) automatically extracted from chat!"}
+                    added, skipped = approve_ai_tasks(chat_items, chat_sels, "Chat AI extracted")
+                    store.resolve_suggestions([i for i, sel in zip(pending_chat.index, chat_sels) if sel], [i for i, sel in zip(pending_chat.index, chat_sels) if not sel])
+                    st.session_state.inline_msg = {"loc": "ai_chat", "msg": import_msg(added, skipped, "chat")}
                     st.rerun()
 
     # ==========================================
@@ -825,13 +905,13 @@ else:
         st.subheader("🛡️ Admin Console")
         
         st.markdown("#### 👥 User Management")
-        if not st.session_state.user_db.empty: st.dataframe(st.session_state.user_db, hide_index=True, use_container_width=True)
+        if not user_db.empty: st.dataframe(user_db, hide_index=True, use_container_width=True)
         
         show_inline_msg("admin_edit") 
-        user_to_update = st.selectbox("Select User to Edit", ["-- Select User --"] + st.session_state.user_db["Full Name"].tolist())
+        user_to_update = st.selectbox("Select User to Edit", ["-- Select User --"] + user_db["Full Name"].tolist())
         if user_to_update != "-- Select User --":
-            curr_user = st.session_state.user_db[st.session_state.user_db["Full Name"] == user_to_update].iloc[0]
-            idx = st.session_state.user_db.index[st.session_state.user_db["Full Name"] == user_to_update].tolist()[0]
+            curr_user = user_db[user_db["Full Name"] == user_to_update].iloc[0]
+            idx = user_db.index[user_db["Full Name"] == user_to_update].tolist()[0]
             with st.form("update_user_details"):
                 c1, c2 = st.columns(2)
                 n_n = c1.text_input("Name", value=curr_user["Full Name"])
@@ -841,8 +921,7 @@ else:
                 n_r = c1.selectbox("Role", ["Standard", "Admin", "Viewer Only"], index=["Standard", "Admin", "Viewer Only"].index(curr_user["Role"]))
                 n_pw = c2.text_input("Password", value=curr_user["Password"], type="password")
                 if st.form_submit_button("Save Changes"):
-                    st.session_state.user_db.loc[idx] = [n_n, n_e, n_p, n_s, n_r, n_pw]
-                    save_data(st.session_state.user_db, "users")
+                    store.update_row("users", idx, {"Full Name": n_n, "Email": n_e, "Phone Number": n_p, "Status": n_s, "Role": n_r, "Password": n_pw})
                     st.session_state.inline_msg = {"loc": "admin_edit", "msg": f"✅ Profile for {n_n} updated successfully."}
                     st.rerun()
 
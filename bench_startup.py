@@ -0,0 +1,118 @@
+"""Startup benchmark for the Badiri App.
+
+Works on a scratch copy of the app and its CSV seeds, so the real database is
+never touched. It measures:
+
+* the import time of the ``badiri_*`` modules the app imports at the top,
+  in a fresh interpreter that has already loaded Streamlit and pandas, and
+  which optional heavy libraries those imports pulled in (there should be none);
+* the first script run, which migrates a fresh database, and the average warm
+  rerun, logged out and on My Desk, through Streamlit's AppTest.
+
+    python bench_startup.py [--reruns N] [--output bench_output.txt] [--max-rerun-ms MS]
+
+Exits with status 1 if a heavy library is imported at startup or the average
+warm rerun is slower than ``--max-rerun-ms``.
+"""
+import argparse
+import ast
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = "badiriappmain.py"
+HEAVY = ("plotly", "pptx", "requests", "pyarrow", "xlsxwriter", "PIL", "pypdfium2")
+IMPORT_PROBE = """
+import json, sys, time
+import streamlit, pandas
+before = set(sys.modules)
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+elapsed = time.perf_counter() - start
+loaded = sorted({m.split(".")[0] for m in set(sys.modules) - before} & set(json.loads(sys.stdin.read())))
+print(json.dumps({"ms": elapsed * 1000, "heavy": loaded}))
+"""
+
+
+def app_modules(path):
+    """Returns the ``badiri_*`` modules imported at the top level of the app script."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [alias.name for node in tree.body if isinstance(node, ast.Import) for alias in node.names if alias.name.startswith("badiri_")]
+
+
+def scratch_copy():
+    work = tempfile.mkdtemp(prefix="badiri_bench_")
+    for name in os.listdir(HERE):
+        if name.endswith((".py", ".csv")):
+            shutil.copy(os.path.join(HERE, name), work)
+    return work
+
+
+def bench_imports(work):
+    modules = app_modules(os.path.join(work, APP))
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE, *modules], cwd=work, input=json.dumps(HEAVY),
+        capture_output=True, text=True, check=True,
+    )
+    return modules, json.loads(out.stdout)
+
+
+def timed_runs(at, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def bench_app(work, reruns):
+    from streamlit.testing.v1 import AppTest
+    os.chdir(work)
+    sys.path.insert(0, work)
+    at = AppTest.from_file(os.path.join(work, APP), default_timeout=120)
+    results = {"first run": timed_runs(at, 1), "warm rerun, login page": timed_runs(at, reruns)}
+    at.text_input[0].input("admin")
+    at.text_input[1].input("Admin123")
+    at.button[0].click()
+    at.run()
+    results["warm rerun, My Desk"] = timed_runs(at, reruns)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Badiri App import and rerun times.")
+    parser.add_argument("--reruns", type=int, default=10, help="warm reruns to average (default %(default)s)")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--max-rerun-ms", type=float, default=None, help="fail if a warm rerun averages more than this")
+    args = parser.parse_args(argv)
+
+    work = scratch_copy()
+    try:
+        modules, probe = bench_imports(work)
+        lines = [f"import {', '.join(modules)}: {probe['ms']:.0f} ms", f"heavy libraries loaded at import: {', '.join(probe['heavy']) or 'none'}"]
+        app = bench_app(work, args.reruns)
+        lines += [f"{label}: {ms:.0f} ms" for label, ms in app.items()]
+    finally:
+        os.chdir(HERE)
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+    slow = args.max_rerun_ms is not None and max(ms for label, ms in app.items() if label.startswith("warm")) > args.max_rerun_ms
+    return 1 if probe["heavy"] or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
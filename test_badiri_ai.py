@@ -0,0 +1,115 @@
+"""Checks the Gemini client against a local stub server: retries, SSE streaming, item validation and the response cache."""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import badiri_ai as ai
+
+USERS = ["Lefa Otlaadisa"]
+ANSWER = (
+    '```json\n[{"Project": "Stub", "Task Name": "Book venue", "Assignee": "Lefa Otlaadisa"}, '
+    '{"Project": "Stub", "Task Name": }, '
+    '{"Project": "Stub", "Assignee": "Lefa Otlaadisa"}, '
+    '{"Project": "Stub", "Task Name": "Print flyers", "Assignee": "Nobody"}]\n```'
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers streamGenerateContent with ``answer`` as SSE events (raw UTF-8, no charset), after ``fail_first`` 503s."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        state = self.server.state
+        state["hits"] += 1
+        if state["hits"] <= state["fail_first"]:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        answer = state["answer"]
+        for i in range(0, len(answer), 20):
+            event = {"candidates": [{"content": {"parts": [{"text": answer[i:i + 20]}]}}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+        self.close_connection = True
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.state = {"hits": 0, "fail_first": 0, "answer": ANSWER}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(ai, "BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(ai, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ai, "BACKOFF", 0)
+    monkeypatch.setattr(ai, "_session", None)
+    yield server.state
+    server.shutdown()
+    server.server_close()
+
+
+def test_stream_arrives_in_pieces(stub):
+    pieces = list(ai.stream_text("KEY", [ai.text_part("plan")]))
+    assert len(pieces) > 1
+    assert "".join(pieces) == ANSWER
+
+
+def test_non_ascii_text_is_decoded_as_utf8(stub):
+    stub["answer"] = '[{"Project": "Café – Gala", "Task Name": "Réserver la salle", "Assignee": "Lefa Otlaadisa"}]'
+    records = list(ai.stream_tasks("KEY", [ai.text_part("plan")], USERS))
+    assert records == [{"Project": "Café – Gala", "Task Name": "Réserver la salle", "Assignee": "Lefa Otlaadisa"}]
+    assert list(ai.stream_tasks("KEY", [ai.text_part("plan")], USERS)) == records
+    assert stub["hits"] == 1
+
+
+def test_invalid_items_are_skipped(stub):
+    skipped = []
+    records = list(ai.stream_tasks("KEY", [ai.text_part("plan")], USERS, on_skip=lambda: skipped.append(1)))
+    assert records == [
+        {"Project": "Stub", "Task Name": "Book venue", "Assignee": "Lefa Otlaadisa"},
+        {"Project": "Stub", "Task Name": "Print flyers", "Assignee": "Unassigned"},
+    ]
+    assert len(skipped) == 2
+
+
+def test_unavailable_is_retried(stub):
+    stub["fail_first"] = 1
+    stream = ai.submit_tasks("KEY", [ai.text_part("plan")], USERS)
+    stream.wait()
+    assert stream.error is None
+    assert len(stream.items) == 2
+    assert stub["hits"] == 2
+
+
+def test_persistent_failure_raises_ai_error(stub):
+    stub["fail_first"] = ai.RETRIES + 1
+    with pytest.raises(ai.AIError):
+        list(ai.stream_text("KEY", [ai.text_part("plan")]))
+
+
+def test_repeat_answer_comes_from_cache(stub):
+    first = list(ai.stream_tasks("KEY", [ai.text_part("plan")], USERS))
+    second = list(ai.stream_tasks("OTHER KEY", [ai.text_part("plan")], USERS))
+    assert first == second
+    assert stub["hits"] == 1
+
+
+def test_cache_is_capped_and_expires(stub, monkeypatch, tmp_path):
+    monkeypatch.setattr(ai, "CACHE_MAX_FILES", 1)
+    list(ai.stream_text("KEY", [ai.text_part("first")]))
+    list(ai.stream_text("KEY", [ai.text_part("second")]))
+    assert sum(len(files) for _, _, files in os.walk(tmp_path)) == 1
+    monkeypatch.setattr(ai, "CACHE_MAX_AGE", 0)
+    list(ai.stream_text("KEY", [ai.text_part("second")]))
+    assert stub["hits"] == 3